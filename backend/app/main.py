@@ -1,11 +1,42 @@
-from fastapi import FastAPI
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
 from app.routes import extract_topics
 from app.routes import generate_questions
 from app.routes import send_email
 from app.routes import failed_topics
+from app.routes import courses
+from app.routes import quiz_sessions
+from app.routes import translate_questions
+from app.services.metrics import tracer
+from app.services.models import loader
+from app.services.mcq_generation import prefetch
+from app.services.llm.scheduler import LLMOverloaded, set_request_context
 
-app = FastAPI()
+# Set WARM_UP_MODELS=0 to skip preloading (models are then loaded on first use)
+WARM_UP_MODELS = os.getenv("WARM_UP_MODELS", "1") != "0"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model, tokenizer and faiss before serving traffic. Under
+    # gunicorn (see gunicorn.conf.py) the master has already loaded them before
+    # forking, so this is a no-op in the workers and the pages stay shared.
+    if WARM_UP_MODELS:
+        loader.warm_up()
+    yield
+    prefetch.prefetcher.stop()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Question lists compress well. text/event-stream responses are excluded by the
+# middleware, so SSE events (topic extraction progress) are still sent as they happen.
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Allow CORS (customize origins in prod!)
 app.add_middleware(
@@ -14,10 +45,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
+
+# Per-request tracing: every span recorded while serving the request is collected
+# into one trace, aggregated into the /metrics histograms and, optionally, returned
+# to the client as a Server-Timing header.
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    trace, token = tracer.start_trace()
+    # Per-client fair sharing of the LLM queue
+    client = request.headers.get("X-Client-Id") or (request.client.host if request.client else None)
+    set_request_context(client=client)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        tracer.end_trace(token)
+    # Label by route template rather than raw path to keep the label set bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    tracer.record_request(route, time.perf_counter() - start)
+    if tracer.SERVER_TIMING_ENABLED and trace.spans:
+        response.headers["Server-Timing"] = tracer.server_timing(trace)
+    return response
+
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloaded):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return tracer.render_prometheus()
+
+
 # Register your route
 app.include_router(extract_topics.router)
 app.include_router(generate_questions.router)
 app.include_router(send_email.router)
-app.include_router(failed_topics.router)
\ No newline at end of file
+app.include_router(failed_topics.router)
+app.include_router(courses.router)
+app.include_router(quiz_sessions.router)
+app.include_router(translate_questions.router)
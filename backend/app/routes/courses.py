@@ -0,0 +1,18 @@
+from fastapi import APIRouter, HTTPException
+from app.services.rag import course_store
+
+# --- Router Initialization ---
+router = APIRouter()
+
+
+@router.get("/courses/{course_id}/documents")
+def list_course_documents(course_id: str):
+    """
+    Lists the documents of a course corpus (uploaded with /extract-topics/ and a course_id),
+    to pick from for the `documents` parameter of /generate-questions/.
+
+    Response: {"course_id": "...", "documents": ["chapter-1", "chapter-2", ...]}
+    """
+    if not course_store.valid_id(course_id):
+        raise HTTPException(status_code=400, detail="Invalid course_id")
+    return {"course_id": course_id, "documents": course_store.list_documents(course_id)}
@@ -1,41 +1,215 @@
 from app.services.topic_extracting.topic_extractor import (
+    TopicTally,
     extract_text_from_pdf,
-    extract_topics_from_pdf_text,
+    extract_topics_with_sources,
+    iter_chunk_topics,
+    split_into_chunks,
 )
-from fastapi import APIRouter, UploadFile, File
-from fastapi.responses import JSONResponse
+from app.services.topic_extracting.fast_topics import extract_topics_fast
+from app.services.rag import course_store, generate_faiss_db, topic_index
+from app.services.mcq_generation import prefetch
+from app.services.metrics import tracer
+from app.services.storage.file_store import atomic_write
+from app.services.llm.scheduler import LLMOverloaded, scheduler, set_request_context
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+import contextvars
+import json
 import os
 import shutil
-
-GENERATE_DB_PATH = "app/services/rag/generate_faiss_db.py"
+import tempfile
 
 
 router = APIRouter()
 
+# "llm" asks Ollama for the topics of every chunk; "fast" ranks spaCy noun phrases
+# by TF-IDF and embedding centrality without calling the LLM
+EXTRACTION_MODES = ("llm", "fast")
+MAX_TOPICS = 10
 
-@router.post("/extract-topics/", response_class=JSONResponse)
-async def extract_topics(file: UploadFile = File(...)):
-    temp_file_path = f"temp_{file.filename}"
-    # Save uploaded file to temp path
-    with open(temp_file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
 
+def build_index(extracted_text, course_id=None, document_id=None):
+    """Build the FAISS index (or course shard) for the upload; returns its generation, or None on failure."""
+    try:
+        return generate_faiss_db.main(extracted_text, course_id, document_id)
+    except Exception as e:
+        print(f"FAISS database generation failed: {e}")
+        return None
+
+
+def index_topics(document, topics, sources=None, source_chunks=None):
+    """Record which index chunks belong to each extracted topic, for retrieval without a search."""
     try:
-        # Step 1: Extract text from the PDF
+        with tracer.span("topic_index"):
+            topic_index.index_topics(document, topics, sources, source_chunks)
+    except Exception as e:
+        print(f"Topic map generation failed: {e}")
+
+
+def read_upload(temp_file_path, course_id=None):
+    # Step 1: Extract text from the PDF
+    with tracer.span("pdf_parse"):
         extracted_text = extract_text_from_pdf(temp_file_path)
 
-        # After extracting text from the PDF (assume variable is 'extracted_text')
-        with open("app/services/mcq_generation/OCR_text.txt", "w", encoding="utf-8") as f:
-            f.write(extracted_text)
+    # OCR_text.txt goes with the live single-document index, which course uploads leave alone
+    if course_id is None:
+        atomic_write(generate_faiss_db.OCR_FILE_PATH, extracted_text)
+    return extracted_text
+
+
+def process_upload(temp_file_path, mode="llm", course_id=None, document_id=None):
+    extracted_text = read_upload(temp_file_path, course_id)
 
-        # Starting the FAISS database generation pipeline
-        os.system(f"python3 {GENERATE_DB_PATH}")
+    # Starting the FAISS database generation pipeline (in-process so its
+    # chunk/embed/index spans end up in this request's trace)
+    document = build_index(extracted_text, course_id, document_id)
 
-        # Step 2: Extract topics
-        topics_result = extract_topics_from_pdf_text(extracted_text)
+    # Step 2: Extract topics
+    sources = source_chunks = None
+    if mode == "fast":
+        result = extract_topics_fast(extracted_text)
+    else:
+        result, source_chunks, sources = extract_topics_with_sources(extracted_text, limit=MAX_TOPICS)
 
-        return topics_result
+    if course_id is not None:
+        result.update(course_id=course_id, document_id=document_id)
+    else:
+        # Step 3: link the topics to their chunks in the new index
+        index_topics(document, result.get("topics", []), sources, source_chunks)
+        # Step 4 (opt-in): pre-generate questions while the user picks topics
+        # (the prefetcher only follows the live single-document index)
+        prefetch.schedule(document, result.get("topics", []))
+    return result
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_upload(temp_file_path, mode="llm", course_id=None, document_id=None):
+    """
+    Server-sent events for one upload:
+      topics  {"chunk", "completed", "total", "topics"}  new topics as each chunk finishes
+      result  {"topics"}                                  final list, most frequent first
+      index   {"ready"[, "course_id", "document_id"]}     the FAISS index for generation is built
+      error   {"status_code", "detail", "retry_after"}    the LLM shed the upload
+    The index is built in parallel with topic extraction.
+    """
+    try:
+        extracted_text = read_upload(temp_file_path, course_id)
+        with ThreadPoolExecutor(max_workers=1) as index_executor:
+            index_future = index_executor.submit(
+                contextvars.copy_context().run, build_index, extracted_text, course_id, document_id)
+
+            sources = chunks = None
+            if mode == "fast":
+                result = extract_topics_fast(extracted_text, top_k=MAX_TOPICS)
+                yield sse_event("topics", {"chunk": 0, "completed": 1, "total": 1, "topics": result["topics"]})
+            else:
+                with tracer.span("chunk"):
+                    chunks = split_into_chunks(extracted_text)
+                tally = TopicTally()
+                for completed, (i, topics) in enumerate(iter_chunk_topics(chunks), 1):
+                    yield sse_event("topics", {
+                        "chunk": i,
+                        "completed": completed,
+                        "total": len(chunks),
+                        "topics": tally.add(topics, chunk=i),
+                    })
+                result = {"topics": tally.ranked(MAX_TOPICS)}
+                sources = tally.sources(result["topics"])
+            yield sse_event("result", result)
+
+            document = index_future.result()
+        if course_id is not None:
+            yield sse_event("index", {"ready": document is not None, "course_id": course_id, "document_id": document_id})
+        else:
+            index_topics(document, result["topics"], sources, chunks)
+            yield sse_event("index", {"ready": document is not None})
+            prefetch.schedule(document, result["topics"])
+    except LLMOverloaded as e:
+        yield sse_event("error", {"status_code": e.status_code, "detail": e.detail, "retry_after": e.retry_after})
+    finally:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+
+
+def validate_mode(mode):
+    mode = mode.lower()
+    if mode not in EXTRACTION_MODES:
+        raise HTTPException(status_code=400, detail=f"Mode must be one of: {', '.join(EXTRACTION_MODES)}")
+    return mode
+
+
+def validate_corpus(file, course_id, document_id):
+    """Course uploads become a shard of the course corpus, named after the file unless document_id is given."""
+    if course_id is None:
+        if document_id is not None:
+            raise HTTPException(status_code=400, detail="document_id can only be given together with course_id")
+        return None
+    if not course_store.valid_id(course_id):
+        raise HTTPException(status_code=400, detail="Invalid course_id")
+    document_id = document_id or course_store.document_id_from_filename(file.filename)
+    if not course_store.valid_id(document_id):
+        raise HTTPException(status_code=400, detail="Invalid document_id")
+    return document_id
+
+
+def admit_upload(mode):
+    # Shed the upload before doing any work if the LLM queue cannot take it
+    set_request_context(priority="interactive")
+    if mode == "llm":
+        scheduler.check_admission()
+
+
+def save_upload(file):
+    # Save uploaded file to a unique temp path (workers may receive the same filename)
+    with tracer.span("upload"), tempfile.NamedTemporaryFile(
+        prefix="upload_", suffix=".pdf", delete=False
+    ) as buffer:
+        shutil.copyfileobj(file.file, buffer)
+        return buffer.name
+
+
+@router.post("/extract-topics/", response_class=JSONResponse)
+async def extract_topics(
+    file: UploadFile = File(...),
+    mode: str = Form("llm"),
+    course_id: str = Form(None),
+    document_id: str = Form(None),
+):
+    mode = validate_mode(mode)
+    document_id = validate_corpus(file, course_id, document_id)
+    admit_upload(mode)
+    temp_file_path = save_upload(file)
+
+    try:
+        # The pipeline blocks (and may queue for the LLM), so keep it off the event loop
+        return await run_in_threadpool(process_upload, temp_file_path, mode, course_id, document_id)
     finally:
         # Clean up temp file
         if os.path.exists(temp_file_path):
             os.remove(temp_file_path)
+
+
+@router.post("/extract-topics/stream/")
+async def extract_topics_stream(
+    file: UploadFile = File(...),
+    mode: str = Form("llm"),
+    course_id: str = Form(None),
+    document_id: str = Form(None),
+):
+    """Same as /extract-topics/, but streams topics as server-sent events while chunks finish."""
+    mode = validate_mode(mode)
+    document_id = validate_corpus(file, course_id, document_id)
+    admit_upload(mode)
+    temp_file_path = save_upload(file)
+
+    # A sync generator: Starlette advances it in the threadpool
+    return StreamingResponse(
+        stream_upload(temp_file_path, mode, course_id, document_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
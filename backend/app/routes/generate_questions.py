@@ -1,8 +1,14 @@
 import asyncio
 import time
-from fastapi import APIRouter, HTTPException, Form
+from fastapi import APIRouter, HTTPException, Form, Request, Response
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 import json
 from app.services.mcq_generation import mcq_generator
+from app.services.rag import course_store
+from app.services.llm.cancellation import CancelledByClient, ClientDisconnected, wait_unless_disconnected
+from app.services.llm.singleflight import Singleflight
+from app.services.llm.scheduler import LLMOverloaded, scheduler, set_request_context
 
 
 # --- Router Initialization ---
@@ -12,6 +18,12 @@ router = APIRouter()
 VALID_DIFFICULTIES = ["easy", "medium", "hard"]
 MIN_QUESTIONS = 1
 MAX_QUESTIONS = 50
+# Non-standard "client closed request" status, only ever seen in logs
+CLIENT_CLOSED_REQUEST = 499
+
+# Identical requests in flight at the same time (e.g. a class opening a shared quiz
+# link) share one retrieval + LLM run
+generation_flights = Singleflight("generate_questions")
 
 def log(text: str):
     """Simple logger to print messages to the console."""
@@ -30,18 +42,52 @@ def validate_input(topics_list: list, difficulty: str, num_questions: int) -> tu
     
     return True, ""
 
+def parse_list(value: str) -> list:
+    """JSON list or comma-separated string."""
+    try:
+        items = json.loads(value)
+        if not isinstance(items, list):
+            raise ValueError
+        return items
+    except Exception:
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+def resolve_corpus(course_id, documents):
+    """Validate the course and the document selection; returns the selected document ids or None."""
+    if course_id is None:
+        if documents:
+            raise HTTPException(status_code=400, detail="documents can only be given together with course_id")
+        return None
+    if not course_store.valid_id(course_id):
+        raise HTTPException(status_code=400, detail="Invalid course_id")
+    available = course_store.list_documents(course_id)
+    if not available:
+        raise HTTPException(status_code=404, detail=f"Course '{course_id}' has no documents")
+    if not documents:
+        return None
+    selected = [str(d) for d in parse_list(documents)]
+    unknown = sorted(set(selected) - set(available))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown documents for course '{course_id}': {', '.join(unknown)}")
+    return sorted(set(selected))
+
 # --- API Endpoint ---
 @router.post("/generate-questions/")
-def generate_questions(
+async def generate_questions(
+    request: Request,
     topics: str = Form(...),         # JSON string or comma-separated
     difficulty: str = Form(...),
     num_questions: int = Form(...),
+    course_id: str = Form(None),     # retrieve from a course corpus instead of the last upload
+    documents: str = Form(None),     # optional JSON or comma-separated document ids of the course
 ):
     """
     Generates and returns a list of questions by calling the local MCQ generation model.
-    Uses the text previously extracted from the PDF and stored in OCR_text.txt.
-    Accepts only topics, difficulty, and num_questions as form data. Translation is handled
-    by a separate endpoint.
+    Uses the text previously extracted from the PDF and stored in OCR_text.txt, or with
+    course_id, the documents uploaded to that course (optionally only `documents`).
+    Accepts topics, difficulty, num_questions, course_id and documents as form data. Translation is handled
+    by a separate endpoint. If the client disconnects, the generation is cancelled once no
+    other coalesced request is waiting for it.
 
     Response: List of question objects, each with:
       - question: str
@@ -63,43 +109,52 @@ def generate_questions(
     ]
     """
     # Parse topics (try JSON, fallback to comma-separated)
-    try:
-        topics_list = json.loads(topics)
-        if not isinstance(topics_list, list):
-            raise ValueError
-    except Exception:
-        topics_list = [t.strip() for t in topics.split(',') if t.strip()]
+    topics_list = parse_list(topics)
     
     # Validate input parameters
     is_valid, error_message = validate_input(topics_list, difficulty, num_questions)
     if not is_valid:
         raise HTTPException(status_code=400, detail=error_message)
+    selected_documents = resolve_corpus(course_id, documents)
     
     model_input = {
         "topics": topics_list,
         "difficulty": difficulty.lower(),
-        "num_questions": num_questions
+        "num_questions": num_questions,
+        "course_id": course_id,
+        "documents": selected_documents,
     }
+    # Quiz generation is interactive: it is served ahead of bulk and background work
+    set_request_context(priority="interactive")
 
+    def run_generation():
+        # Shed load before retrieval; coalesced duplicates never reach this point
+        scheduler.check_admission()
+        return mcq_generator.main(model_input)
+
+    log(f"Generating {num_questions} questions for topics: {topics_list} with difficulty: {difficulty}")
+    start_time = time.perf_counter()
+    # The fingerprint reads the index generation(s) from disk
+    fingerprint = await run_in_threadpool(mcq_generator.request_fingerprint, model_input)
+    flight, is_leader = generation_flights.join(fingerprint)
+    if is_leader:
+        work = asyncio.ensure_future(run_in_threadpool(generation_flights.run, flight, run_generation))
+    else:
+        # Followers await the leader's result without holding a worker thread, so a burst of
+        # identical requests cannot use up the threadpool. The shield keeps a cancelled
+        # follower from cancelling the shared future.
+        work = asyncio.ensure_future(asyncio.shield(asyncio.wrap_future(flight.future)))
     try:
-        log(f"Generating {num_questions} questions for topics: {topics_list} with difficulty: {difficulty}")
-        log(f"Starting MCQ generation at {time.time()}")
-        
-        generated_questions = mcq_generator.main(model_input)
-        
-        log(f"MCQ generation completed at {time.time()}")
-        
-        if isinstance(generated_questions, list) and generated_questions:
-            log(f"Successfully generated {len(generated_questions)} questions from the local model.")
-            return generated_questions
-        else:
-            log(f"Model returned an invalid or empty response: {generated_questions}")
-            raise HTTPException(
-                status_code=500,
-                detail="The question generation model failed to produce a valid response."
-            )
-    except HTTPException:
-        # Re-raise HTTP exceptions as-is
+        generated_questions = await wait_unless_disconnected(request, work)
+    except ClientDisconnected:
+        # The worker thread notices the cancellation and unwinds on its own
+        log("Client disconnected, abandoning question generation")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except CancelledByClient:
+        # Every caller of a shared flight left before it finished
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except (HTTPException, LLMOverloaded):
+        # Re-raise HTTP and load-shedding exceptions as-is
         raise
     except Exception as e:
         log(f"An error occurred while calling the generation model: {e}")
@@ -107,3 +162,17 @@ def generate_questions(
             status_code=500,
             detail=f"Internal server error during question generation: {str(e)}"
         )
+    finally:
+        generation_flights.leave(flight)
+
+    log(f"MCQ generation completed in {time.perf_counter() - start_time:.2f} seconds")
+
+    if isinstance(generated_questions, list) and generated_questions:
+        log(f"Successfully generated {len(generated_questions)} questions from the local model.")
+        # orjson serializes the question dataclasses directly, without jsonable_encoder
+        return ORJSONResponse(generated_questions)
+    log(f"Model returned an invalid or empty response: {generated_questions}")
+    raise HTTPException(
+        status_code=500,
+        detail="The question generation model failed to produce a valid response."
+    )
@@ -0,0 +1,102 @@
+import json
+from fastapi import APIRouter, HTTPException, Form
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from app.routes.generate_questions import resolve_corpus
+from app.schemas.quiz import QuizPlan
+from app.services.llm.scheduler import LLMOverloaded, scheduler, set_request_context
+from app.services.quiz import sessions
+
+# --- Router Initialization ---
+router = APIRouter()
+
+# --- Configuration ---
+MAX_SESSION_QUESTIONS = 100
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 20
+
+def log(text: str):
+    """Simple logger to print messages to the console."""
+    print(f"INFO: {__name__} - {text}")
+
+def parse_plan(plan: str) -> list:
+    """Validate the plan form field: a JSON list of {"topic", "count", "difficulty"} objects."""
+    try:
+        items = QuizPlan(items=json.loads(plan)).items
+    except (json.JSONDecodeError, ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid plan: {e}")
+    total = sum(item.count for item in items)
+    if total > MAX_SESSION_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"A quiz session can have at most {MAX_SESSION_QUESTIONS} questions")
+    return [item.model_dump() for item in items]
+
+def load_session(session_id: str) -> dict:
+    if not sessions.valid_session_id(session_id):
+        raise HTTPException(status_code=404, detail="Quiz session not found")
+    try:
+        return sessions.load(session_id)
+    except sessions.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Quiz session not found")
+
+async def serve_page(session: dict, page: int) -> dict:
+    if page < 0 or page >= sessions.page_count(session):
+        raise HTTPException(status_code=404, detail=f"Page must be between 0 and {sessions.page_count(session) - 1}")
+    # Pages that still have to be generated are interactive LLM work
+    set_request_context(priority="interactive")
+    if str(page) not in session["pages"]:
+        scheduler.check_admission()
+    try:
+        session, questions = await run_in_threadpool(sessions.get_page, session["id"], page)
+    except sessions.SessionNotFound:
+        raise HTTPException(status_code=404, detail="Quiz session not found")
+    except (HTTPException, LLMOverloaded):
+        raise
+    except Exception as e:
+        log(f"An error occurred while generating page {page} of session {session['id']}: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error during question generation: {str(e)}")
+    # Generated while the student answers this page
+    sessions.prefetch_pages(session, page)
+    return {
+        **sessions.summary(session),
+        "page": page,
+        "questions": questions,
+        # Slots of a short page (too few distinct questions could be generated); it is
+        # generated again when requested again
+        "missing_questions": len(sessions.page_slots(session, page)) - len(questions),
+    }
+
+# --- API Endpoints ---
+@router.post("/quiz-sessions/")
+async def create_quiz_session(
+    plan: str = Form(...),              # JSON list of {"topic", "count", "difficulty"}
+    page_size: int = Form(DEFAULT_PAGE_SIZE),
+    course_id: str = Form(None),
+    documents: str = Form(None),
+):
+    """
+    Creates a quiz session for the plan and returns its first page. Later pages are
+    generated when requested (the next one ahead of time), so a student who stops
+    early does not pay for the questions they never see.
+
+    Response: {"session_id", "total_questions", "page_size", "total_pages",
+               "generated_pages", "page", "questions": [...], "missing_questions"}
+    """
+    plan_items = parse_plan(plan)
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    selected_documents = resolve_corpus(course_id, documents)
+    set_request_context(priority="interactive")
+    scheduler.check_admission()
+
+    session = sessions.create_session(plan_items, page_size, course_id, selected_documents)
+    return await serve_page(session, 0)
+
+@router.get("/quiz-sessions/{session_id}")
+def get_quiz_session(session_id: str):
+    """Progress of a session: its size and which pages have been generated."""
+    return sessions.summary(load_session(session_id))
+
+@router.get("/quiz-sessions/{session_id}/pages/{page}")
+async def get_quiz_page(session_id: str, page: int):
+    """Returns one page of questions (0-based), generating it if it is not ready yet."""
+    return await serve_page(load_session(session_id), page)
@@ -0,0 +1,53 @@
+import json
+from fastapi import APIRouter, HTTPException, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+import msgspec
+from app.schemas.question import to_builtins, to_questions
+from app.services.translator import translator
+
+# --- Router Initialization ---
+router = APIRouter()
+
+# --- Configuration ---
+MAX_QUESTIONS = 100
+
+def log(text: str):
+    """Simple logger to print messages to the console."""
+    print(f"INFO: {__name__} - {text}")
+
+@router.post("/translate-questions/")
+async def translate_questions(
+    questions: str = Form(...),        # JSON list of questions as returned by /generate-questions/
+    target_language: str = Form(...),  # e.g. "hi"
+):
+    """
+    Translates generated questions (question, options and explanation) with a local
+    translation model. Strings shared between questions are translated once, and
+    translations are cached across requests.
+
+    Response: the same list of question objects, translated.
+    """
+    target_language = target_language.strip().lower()
+    if target_language not in translator.SUPPORTED_LANGUAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"target_language must be one of: {', '.join(translator.SUPPORTED_LANGUAGES)}",
+        )
+    try:
+        parsed = json.loads(questions)
+        if not isinstance(parsed, list) or not parsed:
+            raise ValueError("questions must be a non-empty JSON array")
+        if len(parsed) > MAX_QUESTIONS:
+            raise ValueError(f"At most {MAX_QUESTIONS} questions can be translated at once")
+        validated = to_builtins(to_questions(parsed))
+    except (ValueError, msgspec.ValidationError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid questions: {e}")
+
+    try:
+        # The model runs on the CPU for a while, so keep it off the event loop
+        translated = await run_in_threadpool(translator.translate_questions, validated, target_language)
+    except Exception as e:
+        log(f"An error occurred while translating questions: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error during translation: {str(e)}")
+    return ORJSONResponse(translated)
@@ -0,0 +1,82 @@
+import copy
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Annotated, List, Literal
+
+import msgspec
+from pydantic import BaseModel, Field
+
+
+# The question types are plain slotted dataclasses: msgspec decodes and validates LLM
+# output straight into them, orjson serializes them natively in responses, and they
+# are what the question pool holds (stored sessions and batch records hold builtins).
+@dataclass(slots=True)
+class Options:
+    A: Annotated[str, msgspec.Meta(description="Option A text")]
+    B: Annotated[str, msgspec.Meta(description="Option B text")]
+    C: Annotated[str, msgspec.Meta(description="Option C text")]
+    D: Annotated[str, msgspec.Meta(description="Option D text")]
+
+
+@dataclass(slots=True)
+class Question:
+    """
+    A single generated MCQ. This type is the source of truth for the JSON schema sent
+    to Ollama (structured outputs) and for validating what comes back.
+    """
+    question: Annotated[str, msgspec.Meta(description="The question text")]
+    options: Options
+    correct_answer: Annotated[Literal["A", "B", "C", "D"], msgspec.Meta(description="Label of the correct option")]
+    topics: Annotated[List[str], msgspec.Meta(description="Topics the question covers")]
+    explanation: Annotated[str, msgspec.Meta(description="Why the answer is correct and the others are not")]
+
+
+@dataclass(slots=True)
+class QuestionList:
+    questions: List[Question]
+
+
+_question_list_decoder = msgspec.json.Decoder(QuestionList)
+
+
+def decode_question_list(data) -> List[Question]:
+    """Decode and validate a {"questions": [...]} JSON document; raises msgspec.DecodeError."""
+    return _question_list_decoder.decode(data).questions
+
+
+def to_questions(items) -> List[Question]:
+    """Validate already parsed question dicts; raises msgspec.ValidationError."""
+    return msgspec.convert(items, List[Question])
+
+
+def to_builtins(questions):
+    """Questions as plain dicts and lists, for json.dumps-based storage."""
+    return msgspec.to_builtins(questions)
+
+
+MAX_CHUNK_TOPICS = 5
+
+
+class TopicList(BaseModel):
+    topics: List[str] = Field(..., max_length=MAX_CHUNK_TOPICS, description="Short noun-phrase topics")
+
+
+@lru_cache(maxsize=1)
+def _question_list_schema() -> dict:
+    # Inline the root so the schema is not a bare $ref, which Ollama's grammar converter expects
+    (_,), components = msgspec.json.schema_components([QuestionList], ref_template="#/$defs/{name}")
+    schema = dict(components.pop("QuestionList"))
+    schema["$defs"] = components
+    return schema
+
+
+def question_list_schema(num_questions: int) -> dict:
+    """JSON schema for exactly `num_questions` questions, for Ollama's `format` parameter."""
+    schema = copy.deepcopy(_question_list_schema())
+    schema["properties"]["questions"]["minItems"] = num_questions
+    schema["properties"]["questions"]["maxItems"] = num_questions
+    return schema
+
+
+def topic_list_schema() -> dict:
+    return TopicList.model_json_schema()
@@ -0,0 +1,13 @@
+from pydantic import BaseModel, Field
+from typing import List, Literal
+
+
+class PlanItem(BaseModel):
+    topic: str = Field(..., min_length=1, description="Topic the questions should cover")
+    count: int = Field(..., gt=0, description="Number of questions on this topic")
+    difficulty: Literal["easy", "medium", "hard"] = Field("medium", description="Difficulty of these questions")
+
+
+class QuizPlan(BaseModel):
+    """What a quiz session will contain; questions are only generated page by page."""
+    items: List[PlanItem] = Field(..., min_length=1)
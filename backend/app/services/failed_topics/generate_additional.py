@@ -1,17 +1,31 @@
 import os
 import json
 import csv
-import google.generativeai as genai
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from app.services.storage.file_store import atomic_write_json
 
 # Load environment variables from a .env file
 load_dotenv()
 
-# Configure the API key from environment variables
-try:
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-except KeyError:
-    print("Warning: The 'GOOGLE_API_KEY' environment variable is not set.")
+_genai = None
+_genai_lock = threading.Lock()
+
+
+def get_genai():
+    """Import and configure the Gemini client on first use instead of at import time."""
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            # Configure the API key from environment variables
+            try:
+                genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
+            except KeyError:
+                print("Warning: The 'GOOGLE_API_KEY' environment variable is not set.")
+            _genai = genai
+    return _genai
 
 def generate_mcqs(topic, num_questions=3):
     """
@@ -42,6 +56,7 @@ def generate_mcqs(topic, num_questions=3):
     The output must be a valid JSON string, and nothing else.
     """
     
+    genai = get_genai()
     model = genai.GenerativeModel('gemini-1.5-flash')
     
     try:
@@ -77,21 +92,46 @@ def read_topics_from_csv(filepath):
         print(f"Error: The CSV file must have a header named 'topic'.")
     return topics
 
-if __name__ == '__main__':
-    csv_filepath = 'topics.csv'
-    all_topics = read_topics_from_csv(csv_filepath)
-    
-    if all_topics:
+def generate_for_topics(topics, output_filepath, num_questions=2, workers=4):
+    """
+    Generate questions for every topic not yet in `output_filepath`, a few topics at a
+    time, rewriting the file (atomically) as each topic finishes so an interrupted run
+    can be resumed.
+    """
+    try:
+        with open(output_filepath, 'r', encoding='utf-8') as file:
+            all_generated_mcqs = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
         all_generated_mcqs = {}
-        for topic in all_topics:
-            print(f"⏳ Generating MCQs for topic: '{topic}'...")
-            questions = generate_mcqs(topic, num_questions=2)
-            if questions:
+    pending = [topic for topic in dict.fromkeys(topics) if topic not in all_generated_mcqs]
+    print(f"{len(topics) - len(pending)} topics already generated, {len(pending)} to go")
+
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generate_mcqs, topic, num_questions): topic for topic in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            topic = futures[future]
+            questions = future.result()
+            if not questions:
+                print(f"[{done}/{len(pending)}] No MCQs for topic '{topic}'")
+                continue
+            with lock:
                 all_generated_mcqs[topic] = questions
-        
-        # Save all generated questions to a single JSON file
-        output_filepath = 'generated_mcqs.json'
-        with open(output_filepath, 'w', encoding='utf-8') as json_file:
-            json.dump(all_generated_mcqs, json_file, indent=4)
-        
-        print(f"\n✅ All generated MCQs have been saved to '{output_filepath}'.")
\ No newline at end of file
+                atomic_write_json(output_filepath, all_generated_mcqs, indent=4)
+            print(f"[{done}/{len(pending)}] Saved MCQs for topic '{topic}'")
+    return all_generated_mcqs
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate MCQs for the topics of a CSV file with Gemini")
+    parser.add_argument('--csv', default='topics.csv', help="CSV file with a 'topic' column")
+    parser.add_argument('--output', default='generated_mcqs.json')
+    parser.add_argument('--num-questions', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    all_topics = read_topics_from_csv(args.csv)
+    if all_topics:
+        generate_for_topics(all_topics, args.output, args.num_questions, args.workers)
+        print(f"\n✅ All generated MCQs have been saved to '{args.output}'.")
@@ -0,0 +1,59 @@
+import asyncio
+import contextvars
+import threading
+from contextlib import contextmanager
+
+
+# Seconds between checks of whether the HTTP client is still connected
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class CancelledByClient(Exception):
+    """The work was abandoned because nobody is waiting for its result any more."""
+
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before the response was ready."""
+
+
+# threading.Event set when the current unit of work should stop
+_cancel_event = contextvars.ContextVar("cancel_event", default=None)
+
+
+@contextmanager
+def bind(event):
+    """Make `event` the cancellation token for everything run inside the block."""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def is_cancelled():
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def raise_if_cancelled():
+    if is_cancelled():
+        raise CancelledByClient("Request cancelled by the client")
+
+
+def new_token():
+    return threading.Event()
+
+
+async def wait_unless_disconnected(request, task, poll=DISCONNECT_POLL_SECONDS):
+    """
+    Await `task`, polling the client connection meanwhile. Raises ClientDisconnected
+    (leaving the task running; the caller decides how to cancel it) if the client leaves.
+    """
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=poll)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            # Nobody will await the task any more; keep its outcome from being reported as lost
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            raise ClientDisconnected()
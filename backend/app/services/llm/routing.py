@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+import time
+import requests
+from app.services.llm.settings import OLLAMA_HOST
+from app.services.metrics import tracer
+
+
+# Policy table: task -> difficulty -> candidate models, best first. "*" matches any
+# difficulty. The last candidate is the fallback used when none of them is installed.
+# Override with MODEL_ROUTING_POLICY (inline JSON or a path to a JSON file).
+DEFAULT_POLICY = {
+    "topics": {"*": ["llama3.2:3b", "llama3.1"]},
+    "mcq": {
+        "easy": ["llama3.2:3b", "llama3.1"],
+        "medium": ["llama3.1"],
+        "hard": ["llama3.1"],
+        "*": ["llama3.1"],
+    },
+}
+TAGS_TTL = 60  # seconds between refreshes of the installed model list
+TAGS_TIMEOUT = 5
+
+
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def load_policy():
+    raw = os.getenv("MODEL_ROUTING_POLICY")
+    if not raw:
+        return DEFAULT_POLICY
+    try:
+        if os.path.exists(raw):
+            with open(raw, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return json.loads(raw)
+    except (OSError, ValueError) as e:
+        log(f"Invalid MODEL_ROUTING_POLICY ({e}), using the default policy")
+        return DEFAULT_POLICY
+
+
+POLICY = load_policy()
+
+# fetched_at None: never fetched (monotonic() may be below TAGS_TTL right after boot)
+_installed = {"models": None, "fetched_at": None}
+_unavailable = set()
+_lock = threading.Lock()
+
+
+def _normalize(model):
+    return model if ":" in model else f"{model}:latest"
+
+
+def installed_models():
+    """Names of the models the Ollama server has pulled, or None if it cannot be asked."""
+    with _lock:
+        fetched_at = _installed["fetched_at"]
+        if fetched_at is not None and time.monotonic() - fetched_at < TAGS_TTL:
+            return _installed["models"]
+    try:
+        response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=TAGS_TIMEOUT)
+        response.raise_for_status()
+        models = {_normalize(m["name"]) for m in response.json().get("models", [])}
+    except (requests.exceptions.RequestException, ValueError, KeyError):
+        models = None
+    with _lock:
+        _installed.update(models=models, fetched_at=time.monotonic())
+        _unavailable.clear()
+    return models
+
+
+def candidates(task, difficulty=None):
+    table = POLICY.get(task, {})
+    return table.get((difficulty or "*").lower()) or table.get("*") or []
+
+
+def resolve_model(task, difficulty=None, default=None):
+    """
+    Pick the first installed candidate for (task, difficulty). Falls back to the
+    policy's last candidate (or `default`) when none of them is known to be installed.
+    """
+    models = candidates(task, difficulty) or [default]
+    installed = installed_models()
+    for model in models:
+        if model in _unavailable:
+            continue
+        if installed is None or _normalize(model) in installed:
+            return model
+    fallback = default or models[-1]
+    log(f"No installed model for {task}/{difficulty} among {models}, falling back to {fallback}")
+    return fallback
+
+
+def mark_unavailable(model):
+    """Skip a model until the next refresh of the installed list (e.g. after a 404)."""
+    with _lock:
+        _unavailable.add(model)
+    log(f"Model '{model}' is not available, routing to the next candidate")
+
+
+def route_label(task, difficulty, model):
+    return f"{task}/{difficulty or '*'}/{model}"
+
+
+def record_call(task, difficulty, model, seconds, ok, result=None):
+    """Per-route counters used to tune the policy table: calls, failures, latency, tokens."""
+    label = route_label(task, difficulty, model)
+    tracer.increment("llm_route_calls_total", "route", label)
+    if not ok:
+        tracer.increment("llm_route_failures_total", "route", label)
+    tracer.observe("llm_route_seconds", "route", label, seconds)
+    if result:
+        tracer.increment("llm_route_tokens_total", "route", label, result.get("eval_count") or 0)
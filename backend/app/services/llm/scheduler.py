@@ -0,0 +1,208 @@
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from app.services.llm import cancellation
+from app.services.metrics import tracer
+
+
+# Constants
+# The scheduler is per process: under gunicorn every web worker has its own, with its own
+# slots, queues and per-client fairness. By default the workers split the requests Ollama
+# decodes in parallel (OLLAMA_NUM_PARALLEL) between them, so together they do not exceed it.
+WEB_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+OLLAMA_NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENCY", str(max(1, OLLAMA_NUM_PARALLEL // WEB_WORKERS))))
+# Priority classes, highest first
+PRIORITIES = ("interactive", "bulk", "background")
+QUEUE_LIMITS = {"interactive": 64, "bulk": 32, "background": 16}
+# Slots a class may hold at once (classes not listed may use all of them)
+CLASS_CONCURRENCY = {"background": int(os.getenv("LLM_BACKGROUND_CONCURRENCY", "1"))}
+# Longest a single LLM call may wait for a slot. Each call gets the full budget, so a
+# request making many calls (many topics, a large PDF) is not cut off partway through.
+QUEUE_DEADLINES = {"interactive": 200.0, "bulk": 600.0, "background": 1800.0}
+DEFAULT_SERVICE_SECONDS = 20.0  # service-time estimate until calls have been measured
+EWMA_ALPHA = 0.2
+CANCEL_POLL_SECONDS = 0.5
+
+
+class LLMOverloaded(Exception):
+    """Raised instead of queueing work that cannot be served in time (429/503 + Retry-After)."""
+
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    __slots__ = ("priority", "client", "granted", "granted_at")
+
+    def __init__(self, priority, client):
+        self.priority = priority
+        self.client = client
+        self.granted = False
+        self.granted_at = None
+
+
+# Per-request scheduling context, set by the route and inherited by worker threads
+_priority = contextvars.ContextVar("llm_priority", default="interactive")
+_client = contextvars.ContextVar("llm_client", default="anonymous")
+
+
+def set_request_context(priority=None, client=None):
+    """Tag the current request; its LLM calls inherit the priority and client."""
+    if priority is not None:
+        _priority.set(priority)
+    if client is not None:
+        _client.set(client)
+
+
+class Scheduler:
+    """
+    This worker's gate in front of the LLM: at most `max_concurrent` calls run at once, waiting
+    calls are served by priority class and round-robin across clients within a class,
+    and calls that could not get a slot within their class's queue deadline or would
+    overflow a queue are shed immediately.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, queue_limits=QUEUE_LIMITS):
+        self.max_concurrent = max_concurrent
+        self.queue_limits = queue_limits
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_by_class = {priority: 0 for priority in PRIORITIES}
+        # priority -> OrderedDict(client -> deque of tickets)
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._service_seconds = DEFAULT_SERVICE_SECONDS
+
+    # ----------------------------
+    # Estimates
+    # ----------------------------
+    def service_rate(self):
+        """Measured LLM calls completed per second at full concurrency."""
+        return self.max_concurrent / self._service_seconds
+
+    def estimated_wait(self, priority):
+        """Seconds a new call of this class would wait: everything queued ahead of it."""
+        with self._cond:
+            ahead = sum(self._queued[p] for p in PRIORITIES[:PRIORITIES.index(priority) + 1])
+            busy = max(0, self._active + ahead - self.max_concurrent + 1)
+            return busy / self.service_rate()
+
+    def load(self, priority):
+        """Calls of this class running or waiting for a slot."""
+        with self._cond:
+            return self._active_by_class[priority] + self._queued[priority]
+
+    def _retry_after(self):
+        queued = sum(self._queued.values()) + self._active
+        return max(1, math.ceil(queued / self.service_rate()))
+
+    # ----------------------------
+    # Admission
+    # ----------------------------
+    def check_admission(self, priority=None):
+        """Fail fast (429 if the class queue is full, 503 if a slot is not expected within the queue deadline)."""
+        priority = priority or _priority.get()
+        with self._cond:
+            if self._queued[priority] >= self.queue_limits[priority]:
+                tracer.increment("llm_shed_total", "reason", "queue_full")
+                raise LLMOverloaded(
+                    429, f"Too many queued {priority} LLM requests", self._retry_after())
+        wait = self.estimated_wait(priority)
+        if wait > QUEUE_DEADLINES[priority]:
+            tracer.increment("llm_shed_total", "reason", "deadline")
+            with self._cond:
+                retry_after = self._retry_after()
+            raise LLMOverloaded(
+                503, f"LLM is overloaded, estimated wait {wait:.0f}s exceeds the deadline", retry_after)
+
+    def _dispatch(self):
+        # Called with the condition held: hand free slots to the best waiting tickets
+        while self._active < self.max_concurrent:
+            for priority in PRIORITIES:
+                clients = self._queues[priority]
+                limit = CLASS_CONCURRENCY.get(priority, self.max_concurrent)
+                if clients and self._active_by_class[priority] < limit:
+                    client, tickets = next(iter(clients.items()))
+                    ticket = tickets.popleft()
+                    # Round-robin: the client goes to the back of its class
+                    del clients[client]
+                    if tickets:
+                        clients[client] = tickets
+                    self._queued[priority] -= 1
+                    break
+            else:
+                return
+            ticket.granted = True
+            ticket.granted_at = time.monotonic()
+            self._active += 1
+            self._active_by_class[ticket.priority] += 1
+            self._cond.notify_all()
+
+    def acquire(self, priority=None, client=None):
+        priority = priority or _priority.get()
+        client = client or _client.get()
+        self.check_admission(priority)
+        ticket = _Ticket(priority, client)
+        queued_at = time.monotonic()
+        deadline = queued_at + QUEUE_DEADLINES[priority]
+        with self._cond:
+            if self._queued[priority] >= self.queue_limits[priority]:
+                tracer.increment("llm_shed_total", "reason", "queue_full")
+                raise LLMOverloaded(
+                    429, f"Too many queued {priority} LLM requests", self._retry_after())
+            self._queues[priority].setdefault(client, deque()).append(ticket)
+            self._queued[priority] += 1
+            self._dispatch()
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    tracer.increment("llm_shed_total", "reason", "queue_timeout")
+                    raise LLMOverloaded(
+                        503, "Timed out waiting for the LLM", self._retry_after())
+                if cancellation.is_cancelled():
+                    self._remove(ticket)
+                    tracer.increment("llm_shed_total", "reason", "cancelled")
+                    cancellation.raise_if_cancelled()
+                # Wake up periodically to notice cancellation
+                self._cond.wait(min(remaining, CANCEL_POLL_SECONDS))
+        tracer.observe("llm_queue_seconds", "priority", priority, time.monotonic() - queued_at)
+        return ticket
+
+    def _remove(self, ticket):
+        clients = self._queues[ticket.priority]
+        tickets = clients.get(ticket.client)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._queued[ticket.priority] -= 1
+            if not tickets:
+                del clients[ticket.client]
+
+    def release(self, ticket):
+        with self._cond:
+            elapsed = time.monotonic() - ticket.granted_at
+            self._service_seconds += EWMA_ALPHA * (elapsed - self._service_seconds)
+            self._active -= 1
+            self._active_by_class[ticket.priority] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority=None, client=None):
+        """Hold one LLM slot for the duration of the block."""
+        ticket = self.acquire(priority, client)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+
+# Shared by every LLM call site in this worker
+scheduler = Scheduler()
@@ -0,0 +1,6 @@
+import os
+
+# Same variable the ollama client library reads, so every call site hits one server
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434").rstrip("/")
+if not OLLAMA_HOST.startswith("http"):
+    OLLAMA_HOST = f"http://{OLLAMA_HOST}"
@@ -0,0 +1,82 @@
+import threading
+from concurrent.futures import Future
+from app.services.llm import cancellation
+from app.services.metrics import tracer
+
+
+class Flight:
+    """One in-flight unit of work: its shared result, its waiters and its cancellation token."""
+
+    def __init__(self, key):
+        self.key = key
+        self.future = Future()
+        self.cancel_event = cancellation.new_token()
+        self.waiters = 0
+
+
+class Singleflight:
+    """
+    Coalesce concurrent calls that share a key: the first caller (the leader) runs the
+    work, every caller that arrives while it is in flight waits for and shares its result.
+    The work is cancelled only once every waiter has left. Nothing is cached once the
+    flight lands.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """Register a waiter for `key`. Returns (flight, is_leader)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            # A cancelled flight is still unwinding; do not attach new callers to it
+            is_leader = flight is None or flight.cancel_event.is_set()
+            if is_leader:
+                flight = self._flights[key] = Flight(key)
+            flight.waiters += 1
+        if not is_leader:
+            tracer.increment("coalesced_requests_total", "group", self.name)
+        return flight, is_leader
+
+    def leave(self, flight):
+        """Drop a waiter that no longer wants the result; the last one out cancels the work."""
+        with self._lock:
+            flight.waiters -= 1
+            abandoned = flight.waiters <= 0 and not flight.future.done()
+        if abandoned:
+            flight.cancel_event.set()
+
+    def run(self, flight, fn):
+        """Run the leader's work with the flight's cancellation token bound."""
+        try:
+            with cancellation.bind(flight.cancel_event):
+                result = fn()
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        else:
+            flight.future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+
+    def wait(self, flight, is_leader, fn):
+        """Blocking half of a joined call: the leader runs `fn`, followers wait for it."""
+        if is_leader:
+            return self.run(flight, fn)
+        return flight.future.result()
+
+    def do(self, key, fn):
+        flight, is_leader = self.join(key)
+        try:
+            return self.wait(flight, is_leader, fn)
+        finally:
+            self.leave(flight)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,278 @@
+"""
+Resumable bulk question generation, e.g. overnight pre-generation for a course.
+
+The manifest is a JSONL file with one item per line:
+    {"topics": ["Atomic Size"], "difficulty": "medium", "count": 10,
+     "course_id": "chem-101", "document": "d-f-block", "id": "optional-stable-id"}
+course_id/document (or "documents": [...]) are optional; without them the live index is used.
+
+Items run on a thread pool that shares this process's LLM scheduler (LLM_MAX_CONCURRENCY
+calls at a time). That scheduler is separate from the API server's: when both use the same
+Ollama, lower LLM_MAX_CONCURRENCY here to leave it room for interactive requests. Each
+finished item is appended to the output JSONL file right away with status "ok", "partial"
+(some topics produced no questions, listed in "missing_topics") or "failed". Starting again
+with the same arguments skips "ok" items, generates only the missing topics of "partial"
+ones and reruns "failed" ones, so a crashed or interrupted run continues where it stopped.
+The last record of an item id is its current result.
+
+Usage (from backend/):
+    python -m app.services.mcq_generation.batch_generate --manifest manifest.jsonl --output questions.jsonl --workers 8
+"""
+import argparse
+import hashlib
+import json
+import os
+import orjson
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.llm.scheduler import LLMOverloaded, set_request_context
+from .mcq_generator import generate_mcqs
+
+
+# Constants
+DEFAULT_WORKERS = 8
+MAX_OVERLOAD_RETRIES = 5
+VALID_DIFFICULTIES = ("easy", "medium", "hard")
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+# ----------------------------
+# Manifest
+# ----------------------------
+def normalize_item(raw):
+    """Validate one manifest entry and fill in the defaults."""
+    topics = raw.get("topics")
+    if isinstance(topics, str):
+        topics = [topics]
+    if not topics or not all(isinstance(topic, str) and topic.strip() for topic in topics):
+        raise ValueError("'topics' must be a non-empty list of strings")
+    difficulty = str(raw.get("difficulty", "medium")).lower()
+    if difficulty not in VALID_DIFFICULTIES:
+        raise ValueError(f"'difficulty' must be one of: {', '.join(VALID_DIFFICULTIES)}")
+    count = raw.get("count")
+    if not isinstance(count, int) or count < 1:
+        raise ValueError("'count' must be a positive integer")
+    documents = raw.get("documents") or ([raw["document"]] if raw.get("document") else None)
+    if documents and not raw.get("course_id"):
+        raise ValueError("'document'/'documents' need a 'course_id'")
+    return {
+        "id": raw.get("id"),
+        "topics": topics,
+        "difficulty": difficulty,
+        "count": count,
+        "course_id": raw.get("course_id"),
+        "documents": sorted(documents) if documents else None,
+    }
+
+
+def item_id(item, seen):
+    """Stable id from the item's content; identical items get an occurrence suffix."""
+    key = json.dumps({k: v for k, v in item.items() if k != "id"}, sort_keys=True)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    seen[digest] = seen.get(digest, 0) + 1
+    return digest if seen[digest] == 1 else f"{digest}-{seen[digest]}"
+
+
+def read_manifest(path):
+    items = []
+    seen = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = normalize_item(json.loads(line))
+            except (ValueError, AttributeError) as e:
+                raise SystemExit(f"{path}:{line_number}: invalid manifest item: {e}")
+            item["id"] = str(item["id"]) if item["id"] is not None else item_id(item, seen)
+            items.append(item)
+    ids = [item["id"] for item in items]
+    if len(set(ids)) != len(ids):
+        raise SystemExit(f"{path}: item ids must be unique")
+    return items
+
+
+# ----------------------------
+# Output (append-only JSONL, one record per finished item)
+# ----------------------------
+def previous_records(path):
+    """Last record of each item id written by earlier runs; a torn last line is ignored."""
+    records = {}
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            records[record["id"]] = record
+    return records
+
+
+class ResultWriter:
+    """Appends one JSON line per record and fsyncs it, so a crash loses at most the line being written."""
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a+b")
+        # Terminate a line torn by a crash before appending after it
+        if self._file.tell() > 0:
+            self._file.seek(self._file.tell() - 1)
+            if self._file.read(1) != b"\n":
+                self._file.write(b"\n")
+
+    def write(self, record):
+        # orjson writes the question dataclasses as they are, as UTF-8
+        line = orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    def __init__(self, total, skipped):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.questions = 0
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def update(self, questions, ok):
+        with self._lock:
+            self.done += 1
+            self.failed += 0 if ok else 1
+            self.questions += questions
+            elapsed = time.perf_counter() - self.start
+            rate = self.done / elapsed if elapsed else 0.0
+            eta = (self.total - self.done) / rate if rate else float("inf")
+            log(f"{self.done}/{self.total} items ({self.failed} failed or partial, {self.skipped} skipped), "
+                f"{rate * 60:.1f} items/min, {self.questions / elapsed if elapsed else 0.0:.2f} questions/s, "
+                f"ETA {eta / 60:.1f} min")
+
+
+# ----------------------------
+# Generation
+# ----------------------------
+def topic_counts(item):
+    """Questions per topic, split the way generate_mcqs splits them."""
+    per_topic, remainder = divmod(item["count"], len(item["topics"]))
+    return [(topic, per_topic + (1 if i < remainder else 0)) for i, topic in enumerate(item["topics"])]
+
+
+def generate_topic(item, topic, count):
+    """Questions for one topic of an item, waiting out LLM overload (the queue is shared by all workers)."""
+    for attempt in range(MAX_OVERLOAD_RETRIES + 1):
+        try:
+            return generate_mcqs(
+                item["difficulty"], count, [topic], use_pool=False,
+                course_id=item["course_id"], documents=item["documents"])
+        except LLMOverloaded as e:
+            if attempt == MAX_OVERLOAD_RETRIES:
+                raise
+            log(f"Item {item['id']}: LLM overloaded on topic '{topic}', retrying in {e.retry_after}s")
+            time.sleep(e.retry_after)
+
+
+def run_item(item, skip_topics=()):
+    """
+    Generate the questions of one item topic by topic, except `skip_topics`. A topic that
+    fails or yields no questions does not stop the others. Returns (questions, missing
+    topics, last error).
+    """
+    # Orders this process's calls only; the API server has its own scheduler
+    set_request_context(priority="bulk", client="batch")
+    questions, missing, error = [], [], None
+    for topic, count in topic_counts(item):
+        if count <= 0 or topic in skip_topics:
+            continue
+        try:
+            generated = generate_topic(item, topic, count)
+        except Exception as e:
+            generated, error = [], f"{type(e).__name__}: {e}"
+        if not generated:
+            missing.append(topic)
+            error = error or f"no valid questions generated for '{topic}'"
+        questions.extend(generated)
+    return questions, missing, error
+
+
+def process(item, writer, progress, previous=None):
+    start = time.perf_counter()
+    # A partial item keeps the questions of the topics an earlier run finished
+    kept, skip_topics = [], set()
+    if previous is not None and previous.get("status") == "partial":
+        kept = previous.get("questions", [])
+        skip_topics = set(item["topics"]) - set(previous.get("missing_topics", []))
+    questions, missing, error = run_item(item, skip_topics)
+    questions = kept + questions
+    status = "ok" if not missing else ("partial" if questions else "failed")
+    record = {
+        **item,
+        "status": status,
+        "questions": questions,
+        "missing_topics": missing,
+        "seconds": round(time.perf_counter() - start, 3),
+        "finished_at": time.time(),
+    }
+    if status != "ok":
+        record["error"] = error
+        log(f"Item {item['id']} {status}: missing topics {missing} ({error})")
+    writer.write(record)
+    progress.update(len(questions), status == "ok")
+    return status == "ok"
+
+
+def run(manifest_path, output_path, workers=DEFAULT_WORKERS):
+    items = read_manifest(manifest_path)
+    previous = previous_records(output_path)
+    done = {item_id for item_id, record in previous.items() if record.get("status") == "ok"}
+    pending = [item for item in items if item["id"] not in done]
+    log(f"{len(items)} items in the manifest, {len(items) - len(pending)} already done, {len(pending)} to generate")
+    if not pending:
+        return True
+
+    writer = ResultWriter(output_path)
+    progress = Progress(len(pending), len(items) - len(pending))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+    try:
+        futures = [executor.submit(process, item, writer, progress, previous.get(item["id"])) for item in pending]
+        ok = all([future.result() for future in as_completed(futures)])
+    except KeyboardInterrupt:
+        # Items in progress still finish and are written; the rest run on the next start
+        log("Interrupted, finishing the items in progress; run again to continue")
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+        writer.close()
+    log(f"Finished in {(time.perf_counter() - progress.start) / 60:.1f} min: "
+        f"{progress.done - progress.failed} items, {progress.questions} questions, {progress.failed} failed or partial")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--manifest", required=True, help="JSONL file of items to generate")
+    parser.add_argument("--output", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Items in flight; LLM calls are further limited by LLM_MAX_CONCURRENCY")
+    args = parser.parse_args()
+    raise SystemExit(0 if run(args.manifest, args.output, args.workers) else 1)
+
+
+if __name__ == "__main__":
+    main()
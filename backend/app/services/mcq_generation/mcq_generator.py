@@ -1,9 +1,19 @@
 from .prompt import prompt_func
+import os
 import requests
 import json
+import hashlib
 import time
 import random
+import msgspec
 from .retrieval import main as retrieve_context
+from .question_pool import question_pool
+from app.services.metrics import tracer
+from app.services.llm import cancellation, routing
+from app.services.llm.scheduler import scheduler
+from app.services.llm.settings import OLLAMA_HOST
+from app.services.rag import course_store, vector_store
+from app.schemas.question import decode_question_list, question_list_schema, to_questions
 
 
 # Input response format:
@@ -11,20 +21,37 @@ from .retrieval import main as retrieve_context
 #         "topics": {topic: description} ,
 #         "num_questions": ... ,
 #         "difficulty": ...
+#         "course_id": ... (optional: retrieve from a course corpus)
+#         "documents": [...] (optional: only these documents of the course)
 #    }
 
 
 # Constants
 TIMEOUT = 200
 MAX_TRIES = 3
-MODEL_NAME = "llama3.1"
-OLLAMA_URL = "http://localhost:11434/api/generate"
+MODEL_NAME = "llama3.1"  # fallback when the routing policy has no candidate
+OLLAMA_URL = f"{OLLAMA_HOST}/api/generate"
+# Keep the model (and its KV cache) resident between requests so the static
+# prompt prefix does not have to be re-evaluated on every call
+KEEP_ALIVE = "30m"
+# Changing num_ctx between calls reloads the model, so pin it
+NUM_CTX = 8192
+SYSTEM_PROMPT = (
+    "You are a careful and expert MCQ generator. You follow JSON schemas strictly and return a JSON object whose 'questions' array holds the questions, where each question is a JSON object, without any commentary or surrounding text."
+)
+# Context chunks per question (hybrid retrieval puts chunks with the exact term first)
 CHUNKS_PER_Q = {
     "easy": 2,
-    "medium": 3,
-    "hard": 4
+    "medium": 2,
+    "hard": 3
 }
 TEMPERATURE = 0.3
+# Pass the question JSON schema as Ollama's `format` so decoding is constrained to it.
+# Set OLLAMA_STRUCTURED_OUTPUT=0 for servers older than Ollama 0.5.
+STRUCTURED_OUTPUT = os.getenv("OLLAMA_STRUCTURED_OUTPUT", "1") != "0"
+# What to do with the questions already generated when a request is cancelled:
+# "discard" drops them, "cache" keeps them in the question pool for the next request
+CANCELLED_RESULTS = os.getenv("CANCELLED_RESULTS", "cache")
 
 
 # Logging
@@ -33,21 +60,62 @@ def log(text):
 
 
 # LLM caller
-def ollama_prompt(input_dict):
+def build_payload(prompt_text, num_questions=None, model=MODEL_NAME):
+    """
+    Build the /api/generate payload. The system prompt and the options are constant
+    so that consecutive calls share the same token prefix in Ollama's KV cache.
+    With num_questions, the output is constrained to a schema of exactly that many questions.
+    """
+    payload = {
+        "model": model,
+        "prompt": prompt_text,
+        "system": SYSTEM_PROMPT,
+        # Streamed so that a cancelled request can close the connection mid-decode
+        "stream": True,
+        "keep_alive": KEEP_ALIVE,
+        "options": {
+            "temperature": TEMPERATURE,
+            "num_ctx": NUM_CTX,
+        },
+    }
+    if STRUCTURED_OUTPUT and num_questions:
+        payload["format"] = question_list_schema(num_questions)
+    return payload
+
+
+def ollama_generate(input_dict):
+    """
+    Send a request to Ollama and return the full response body, including the
+    timing fields (prompt_eval_count, prompt_eval_duration, eval_duration, ...).
+    The response is streamed; if the request is cancelled the connection is closed,
+    which makes Ollama stop decoding, and CancelledByClient is raised.
+    """
     log("Sending request to OLLAMA API...")
     start_time = time.time()
     try:
-        response = requests.post(
-            OLLAMA_URL,
-            json=input_dict,
-            timeout=TIMEOUT,
-        )
-        response.raise_for_status()
-        result = response.json()["response"]
-        log(f"Successfully received response in {time.time() - start_time} seconds...")
+        # Wait for a global LLM slot; TIMEOUT applies to this call once it holds the slot
+        with scheduler.slot():
+            deadline = time.monotonic() + TIMEOUT
+            with requests.post(
+                OLLAMA_URL,
+                json=input_dict,
+                timeout=TIMEOUT,
+                stream=True,
+            ) as response:
+                response.raise_for_status()
+                result = read_stream(response, deadline)
+        if "response" not in result:
+            raise KeyError("response")
+        tracer.record_ollama(result)
+        log(f"Successfully received response in {time.time() - start_time} seconds "
+            f"(prompt eval: {result.get('prompt_eval_count', 0)} tokens in "
+            f"{result.get('prompt_eval_duration', 0) / 1e9:.2f}s)...")
         return result
     except requests.exceptions.HTTPError as http_err:
         log(f"HTTP error occurred: {http_err}")
+        if http_err.response is not None and http_err.response.status_code == 404:
+            # Ollama answers 404 when the requested model has not been pulled
+            routing.mark_unavailable(input_dict["model"])
     except requests.exceptions.ConnectionError:
         log("Connection error: Could not reach Ollama server.")
     except requests.exceptions.Timeout:
@@ -56,9 +124,47 @@ def ollama_prompt(input_dict):
         log(f"Unexpected error: {err}")
     except KeyError:
         log("Error: 'response' key not found in Ollama output.")
+    except ValueError:
+        log("Error: Ollama stream contained invalid JSON.")
     return None
 
 
+def read_stream(response, deadline=None):
+    """
+    Assemble a streamed /api/generate response (one JSON object per line) into the
+    shape of a non-streamed one, checking for cancellation and the call's `deadline`
+    (time.monotonic()) between chunks.
+    """
+    pieces = []
+    result = {}
+    for line in response.iter_lines():
+        if cancellation.is_cancelled():
+            log("Request cancelled, closing the Ollama stream")
+            tracer.increment("llm_cancelled_total", "call_site", "mcq")
+            cancellation.raise_if_cancelled()
+        if deadline is not None and time.monotonic() > deadline:
+            raise requests.exceptions.Timeout(f"Call exceeded {TIMEOUT}s while decoding")
+        if not line:
+            continue
+        chunk = json.loads(line)
+        if "error" in chunk:
+            raise requests.exceptions.RequestException(chunk["error"])
+        pieces.append(chunk.get("response", ""))
+        if chunk.get("done"):
+            result = chunk
+    if not result:
+        return {}
+    result["response"] = "".join(pieces)
+    return result
+
+
+def ollama_prompt(input_dict):
+    result = ollama_generate(input_dict)
+    if result is None:
+        return None
+    return result["response"]
+
+
 # Json helpers
 def get_json(response_text: str):
     try:
@@ -72,104 +178,179 @@ def get_json(response_text: str):
         log(response_text)
         return None
 
+def parse_questions(response_text: str):
+    """
+    Decode a structured-output response ({"questions": [...]}) straight into validated
+    Question objects, falling back to slicing a bare JSON array out of free-form text.
+    """
+    try:
+        return decode_question_list(response_text)
+    except msgspec.DecodeError:
+        return get_json(response_text)
+
 # Validation
 
 
-def validate_json(json_raw):
+def validate_questions(parsed):
+    """
+    Validated Question objects, or None. Structured output is already validated while
+    decoding; questions sliced out of free-form text are checked against the same type.
+    """
+    if not isinstance(parsed, list):
+        log("Validation failed: Response is not a list of questions.")
+        return None
     try:
-        if not isinstance(json_raw, list):
-            log("Validation failed: Response is not a list of questions.")
-            return False
-        for idx, item in enumerate(json_raw):
-            required_fields = {
-                "question", "options", "correct_answer", "topics", "explanation"
-            }
-            if not all(field in item for field in required_fields):
-                log(f"Missing fields in question {idx}.")
-                return False
-            if not isinstance(item["options"], dict):
-                log(f"'options' is not a dict in question {idx}.")
-                return False
-            if item["correct_answer"] not in item["options"]:
-                log(f"'correct_answer' not in 'options' in question {idx}.")
-                return False
-        return True
-    except Exception:
-        log("Validation failed unexpectedly.")
-        return False
+        return to_questions(parsed)
+    except msgspec.ValidationError as e:
+        log(f"Validation failed: {e}")
+        return None
 
 
 # Main MCQ generation
-def generate_mcqs(difficulty, num_questions, topic_dict):
+def corpus_key(course_id=None, documents=None):
+    """The content questions are generated from: the live document, or a course's selected shards."""
+    if course_id is None:
+        return vector_store.current_generation()
+    return course_store.corpus_version(course_id, documents or course_store.list_documents(course_id))
+
+
+def generate_mcqs(difficulty, num_questions, topic_dict, use_pool=True, course_id=None, documents=None, avoid=None):
     """
     difficulty: str ("easy", "medium", "hard")
     num_questions: int
     topic_dict: dict in format {topic: description}
+    use_pool: serve pooled questions first
+    course_id, documents: retrieve from these documents of a course corpus instead of the live document
+    avoid: question texts the model is asked not to repeat
+
+    Questions left in the pool for a topic (by prefetching or an earlier cancelled
+    request) are used before generating new ones. Raises CancelledByClient if the
+    request is cancelled.
     """
     # Distribute questions evenly
     # topics = list(topic_dict.keys())
     topics = topic_dict  # A very very very temporary change
     questions_per_topic = num_questions // len(topics)
     remainder = num_questions % len(topics)  # to handle uneven
-    all_questions = []
-
-    for i, topic in enumerate(topics):
-        topic_qs = questions_per_topic + (1 if i < remainder else 0)
-
-        # Calculate retrieval size
-        chunks_needed = CHUNKS_PER_Q[difficulty.lower()] * topic_qs
-        log(f"Retrieving {chunks_needed} chunks for topic '{topic}'")
-
-        # Step 1: Retrieve context from FAISS DB
-        context_text = retrieve_context(
-            topic, difficulty, chunks_needed, f"Content in given text related to {topic}")
-
-        # Step 2: Create prompt for MCQ generation
-        prompt_text = prompt_func(
-            context_text,  # now using RAG context
-            [topic],
-            difficulty,
-            topic_qs
-        )
-        payload = {
-            "model": MODEL_NAME,
-            "prompt": prompt_text,
-            "system": (
-                "You are a careful and expert MCQ generator. You follow JSON schemas strictly and return a JSON array of questions where each question is a JSON object without any commentary or surrounding text."
-            ),
-            "stream": False,
-            "temperature": TEMPERATURE,
-        }
-
-        # Step 3: Call LLM
-        tries = 0
-        while tries < MAX_TRIES:
-            llm_output = ollama_prompt(payload)
-            if llm_output is None:
-                tries += 1
+    document = corpus_key(course_id, documents)
+    # topic -> questions gathered so far (pooled and generated)
+    by_topic = {}
+    pooled = {}
+
+    try:
+        for i, topic in enumerate(topics):
+            cancellation.raise_if_cancelled()
+            topic_qs = questions_per_topic + (1 if i < remainder else 0)
+            pooled[topic] = question_pool.take(document, topic, difficulty, topic_qs) if use_pool else []
+            by_topic[topic] = list(pooled[topic])
+            topic_qs -= len(pooled[topic])
+            if topic_qs <= 0:
+                log(f"Serving {len(pooled[topic])} pooled questions for topic '{topic}'")
                 continue
-            parsed_json = get_json(llm_output)
-            if parsed_json and validate_json(parsed_json):
-                if len(parsed_json) > topic_qs:
-                    parsed_json = parsed_json[:topic_qs]
-                all_questions.extend(parsed_json)
-                break
-            else:
-                log(f"Invalid JSON for topic '{topic}', retrying...")
-                tries += 1
+
+            # Calculate retrieval size
+            chunks_needed = CHUNKS_PER_Q[difficulty.lower()] * topic_qs
+            log(f"Retrieving {chunks_needed} chunks for topic '{topic}'")
+
+            # Step 1: Retrieve context from FAISS DB
+            with tracer.span("retrieve"):
+                context_text = retrieve_context(
+                    topic, difficulty, chunks_needed, f"Content in given text related to {topic}",
+                    course_id=course_id, documents=documents)
+
+            # Step 2: Create prompt for MCQ generation
+            with tracer.span("prompt_build"):
+                prompt_text = prompt_func(
+                    context_text,  # now using RAG context
+                    [topic],
+                    difficulty,
+                    topic_qs,
+                    avoid=avoid,
+                )
+            payload = build_payload(prompt_text, topic_qs)
+
+            # Step 3: Call LLM
+            tries = 0
+            while tries < MAX_TRIES:
+                cancellation.raise_if_cancelled()
+                if tries:
+                    tracer.increment("llm_retries_total", "call_site", "mcq")
+                # Re-resolved on every attempt so a missing model falls through to the next candidate
+                model = routing.resolve_model("mcq", difficulty, default=MODEL_NAME)
+                payload["model"] = model
+                call_start = time.perf_counter()
+                result = ollama_generate(payload)
+                call_seconds = time.perf_counter() - call_start
+                if result is None:
+                    routing.record_call("mcq", difficulty, model, call_seconds, ok=False)
+                    tries += 1
+                    continue
+                with tracer.span("parse"):
+                    parsed = parse_questions(result["response"])
+                with tracer.span("validate"):
+                    questions = validate_questions(parsed) if parsed else None
+                is_valid = bool(questions)
+                routing.record_call("mcq", difficulty, model, call_seconds, ok=is_valid, result=result)
+                if is_valid:
+                    by_topic[topic].extend(questions[:topic_qs])
+                    break
+                else:
+                    tracer.increment("llm_parse_failures_total", "call_site", "mcq")
+                    log(f"Invalid JSON for topic '{topic}', retrying...")
+                    tries += 1
+    except cancellation.CancelledByClient:
+        # Pooled questions always go back; newly generated ones only if configured
+        keep = by_topic if CANCELLED_RESULTS == "cache" else pooled
+        kept = 0
+        for topic, questions in keep.items():
+            question_pool.put(document, topic, difficulty, questions)
+            kept += len(questions)
+        log(f"Generation cancelled, returned {kept} questions to the pool ({CANCELLED_RESULTS})")
+        raise
 
     # Step 4: Shuffle all questions and return
+    all_questions = [question for questions in by_topic.values() for question in questions]
     random.shuffle(all_questions)
     return all_questions
 
 
+def request_fingerprint(input_response):
+    """
+    Stable key for a generation request: the corpus (live index generation, or the
+    course's selected shards), the normalized, sorted topics, the difficulty and the
+    question count.
+    """
+    key = {
+        "document": corpus_key(input_response.get("course_id"), input_response.get("documents")),
+        "topics": sorted({str(t).strip().lower() for t in input_response["topics"]}),
+        "difficulty": input_response["difficulty"].lower(),
+        "num_questions": input_response["num_questions"],
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
 def main(input_response):
     result = generate_mcqs(
-        input_response["difficulty"], input_response["num_questions"], input_response["topics"])
-    print(json.dumps(result, indent=2))
+        input_response["difficulty"], input_response["num_questions"], input_response["topics"],
+        course_id=input_response.get("course_id"), documents=input_response.get("documents"))
+    log(f"Generated {len(result)} questions")
     return result
 
 
 # ENTRY POINT
 if __name__ == "__main__":
-    main()
+    # One request against the live index; see batch_generate for bulk runs
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate MCQs for some topics from the live index")
+    parser.add_argument("--topics", nargs="+", required=True)
+    parser.add_argument("--difficulty", default="medium", choices=list(CHUNKS_PER_Q))
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--course-id", default=None, help="Retrieve from this course corpus instead")
+    args = parser.parse_args()
+    main({
+        "topics": args.topics,
+        "difficulty": args.difficulty,
+        "num_questions": args.num_questions,
+        "course_id": args.course_id,
+    })
@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from collections import deque
+from app.services.llm import cancellation
+from app.services.llm.scheduler import LLMOverloaded, scheduler, set_request_context
+from app.services.rag import vector_store
+from .question_pool import question_pool
+
+
+# Constants
+# Opt-in: set PREFETCH_QUESTIONS=1 to pre-generate questions while the user picks topics
+PREFETCH_ENABLED = os.getenv("PREFETCH_QUESTIONS", "0") == "1"
+PREFETCH_DIFFICULTY = os.getenv("PREFETCH_DIFFICULTY", "medium")  # the UI's default
+PREFETCH_PER_TOPIC = int(os.getenv("PREFETCH_PER_TOPIC", "2"))
+# How long interactive traffic must have been quiet before background work (re)starts
+QUIET_SECONDS = 2.0
+POLL_SECONDS = 0.5
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+class _BackOffToken:
+    """
+    Cancellation token for background generation: it reads as set as soon as an
+    interactive LLM call is running or queued, so the background call closes its
+    Ollama stream and gives the slot back.
+    """
+
+    def __init__(self, stopped):
+        self.stopped = stopped
+
+    def is_set(self):
+        return self.stopped.is_set() or scheduler.load("interactive") > 0
+
+
+class Prefetcher:
+    """
+    Single background thread that fills the question pool with PREFETCH_PER_TOPIC
+    questions per extracted topic at PREFETCH_DIFFICULTY, at "background" priority.
+    Only the most recently uploaded document is prefetched.
+    """
+
+    def __init__(self):
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def schedule(self, document, topics):
+        with self._cond:
+            # A new upload supersedes whatever was pending for older documents
+            self._jobs.clear()
+            self._jobs.extend((document, topic) for topic in topics)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="question-prefetch", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        log(f"Scheduled prefetch of {len(topics)} topics for document {document}")
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._jobs.clear()
+            self._cond.notify()
+
+    def _next_job(self):
+        with self._cond:
+            while not self._jobs and not self._stopped.is_set():
+                self._cond.wait()
+            return self._jobs.popleft() if self._jobs else None
+
+    def _wait_for_quiet(self):
+        quiet_since = time.monotonic()
+        while not self._stopped.is_set():
+            if scheduler.load("interactive") > 0:
+                quiet_since = time.monotonic()
+            elif time.monotonic() - quiet_since >= QUIET_SECONDS:
+                return
+            time.sleep(POLL_SECONDS)
+
+    def _run(self):
+        # Imported here: the generator pulls in retrieval and the embedding model
+        from .mcq_generator import generate_mcqs
+
+        set_request_context(client="prefetch")
+        token = _BackOffToken(self._stopped)
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            document, topic = job
+            if document != vector_store.current_generation():
+                continue
+            needed = PREFETCH_PER_TOPIC - question_pool.size(document, topic, PREFETCH_DIFFICULTY)
+            if needed <= 0:
+                continue
+
+            self._wait_for_quiet()
+            set_request_context(priority="background")
+            try:
+                with cancellation.bind(token):
+                    questions = generate_mcqs(PREFETCH_DIFFICULTY, needed, [topic], use_pool=False)
+            except (cancellation.CancelledByClient, LLMOverloaded):
+                # Interactive traffic arrived or the queue is full: retry the topic later
+                with self._cond:
+                    self._jobs.appendleft(job)
+                continue
+            except Exception as e:
+                log(f"Prefetch failed for topic '{topic}': {e}")
+                continue
+            question_pool.put(document, topic, PREFETCH_DIFFICULTY, questions)
+            log(f"Prefetched {len(questions)} questions for topic '{topic}'")
+
+
+prefetcher = Prefetcher()
+
+
+def schedule(document, topics):
+    """Queue background generation for freshly extracted topics (no-op unless enabled)."""
+    if PREFETCH_ENABLED and document and topics:
+        prefetcher.schedule(document, topics)
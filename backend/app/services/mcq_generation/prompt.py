@@ -1,34 +1,22 @@
-def prompt_func(text_extract, topic, difficulty, number_of_questions):
-    # Normalize topic for heading and JSON example snippets
-    if isinstance(topic, (list, tuple)):
-        topic_heading = ", ".join(str(t) for t in topic)
-        topics_json = "[" + ", ".join(f'"{str(t)}"' for t in topic) + "]"
-    else:
-        topic_heading = str(topic)
-        topics_json = f'"{str(topic)}"'
+import json
+
+# Static instruction block. This MUST stay byte-identical between calls: Ollama keeps
+# the KV cache of the last prompt and only re-evaluates the tokens after the longest
+# common prefix, so everything request-specific goes after this block.
+PROMPT_PREFIX = """
+###
+Context:
+You are an expert multiple-choice question (MCQ) generator trained to create factual, educational, and topic-focused questions using only the information provided in the text extract.
+The text extract, the topic, the difficulty level and the number of questions are given in the REQUEST section at the very end of this prompt.
 
-    promptstr = f"""
 ###
-You are about to be given a text extract.
 The text was extracted using Optical Character Recognition (OCR). Therefore:
 - Ignore any OCR-related text errors, formatting issues, or gibberish.
 - Do not refer to any diagrams, figures, tables, or non-textual elements mentioned in the passage.
-(The text extract starts after this line and ends when you encounter the exact phrase "ADAPTER TOOTHPASTE MEDICINE")
-{text_extract}
-
-ADAPTER TOOTHPASTE MEDICINE
-
-###
-Context:
-You are an expert multiple-choice question (MCQ) generator trained to create factual, educational, and topic-focused questions using only the information provided in the text above.
 
 ###
 Your Task:
-Generate a set of {
-        number_of_questions
-    } high quality multiple-choice questions based on the text extract and the requested topic. Output them in a well-structured JSON array.
-
-### Topic : {topic_heading}
+Generate the requested number of high quality multiple-choice questions based on the text extract and the requested topic. Output them as a JSON object whose "questions" field is the array of questions.
 
 ###
 Guidelines for Good MCQs:
@@ -44,65 +32,96 @@ Guidelines for Good MCQs:
 Constraints:
 - The format for the questions is given below. Make sure that you follow the correct format STRICTLY.
 
-[
-  {{
-    "question": "...",
-    "options": {{
-      "A": "...",
-      "B": "...",
-      "C": "...",
-      "D": "..."
-    }},
-    "correct_answer": "B",
-    "topics": {topics_json},
-    "explanation": "..."
-  }}
-]
+{
+  "questions": [
+    {
+      "question": "...",
+      "options": {
+        "A": "...",
+        "B": "...",
+        "C": "...",
+        "D": "..."
+      },
+      "correct_answer": "B",
+      "topics": ["<topic from the REQUEST section>"],
+      "explanation": "..."
+    }
+  ]
+}
 
   - The `"explanation"` field will contain a brief explanation of why the correct option is the correct one and why the other options are wrong.
 - Do not hallucinate or use any prior information for generating the questions.
 - Double check the truthness of the correct answer and its explanation with the given extract before printing it out.
 - Double check that the options of any question do not contradict with the explanation
-- The difficulty level of the questions should be : {difficulty}
+- The difficulty level of the questions is given in the REQUEST section.
 - Each question should have 4 options labelled A to D. Only one of these options should be correct and the other three should not be very obvious to be wrong.
-- Only generate an array of EXACTLY {number_of_questions} questions. No more, no less.
-- Repeating because this is very important, GIVE EXACTLY {
-        number_of_questions
-    } QUESTIONS in the array.
+- Only generate an array of EXACTLY the requested number of questions. No more, no less.
 - Respond with ONLY the formatted JSON object following the exact format mentioned before. No commentary, explanation or surrounding text.
 
 ###
 An example will now be given to you. These questions have nothing to do with the given text extract. You have to make questions based on the text extract. Notice how every question follows the format strictly. Notice how the explanation explains all the options. Notice how the distractors are not too obvious to be wrong.
-Even if the example only has an array of 2 questions, remember that you have to give an array of exactly {number_of_questions} questions
-Examples of formatted MCQ question array:
+Even if the example only has an array of 2 questions, remember that you have to give an array of exactly the requested number of questions
+Example of a formatted response:
+
+{
+  "questions": [
+    {
+      "question": "Which of the following is true?",
+      "options": {
+        "A": "2 + 0 = 5",
+        "B": "5 - 3 = 2",
+        "C": "6 + 4 = 7",
+        "D": "7 = 8"
+      },
+      "correct_answer": "B",
+      "topics": ["Basic Mathematics"],
+      "explanation": "Option B is the correct answer as the left hand side is equal to the right hand side of the equality. Option A states 2 = 5, which is false. Option C states 10 = 7, which is also false. Option D plainly states a wrong equality."
+    },
+    {
+      "question": "What is 9 + 6?",
+      "options": {
+        "A": "12",
+        "B": "14",
+        "C": "15",
+        "D": "16"
+      },
+      "correct_answer": "C",
+      "topics": ["Basic Mathematics"],
+      "explanation": "9 + 6 equals 15, so option C is correct. The other options are common mistakes if someone adds incorrectly or forgets carrying over."
+    }
+  ]
+}
 
-[
-  {{
-    "question": "Which of the following is true?",
-    "options": {{
-      "A": "2 + 0 = 5",
-      "B": "5 - 3 = 2",
-      "C": "6 + 4 = 7",
-      "D": "7 = 8",
-    }},
-    "correct_answer": "B",
-    "topics": "Basic Mathematics",
-    "explanation": "Option B is the correct answer as the left hand side is equal to the right hand side of the equality. Option A states 2 = 5, which is false. Option C states 10 = 7, which is also false. Option D plainly states a wrong equality.",
-  }},
-  {{
-    "question": "What is 9 + 6?",
-    "options": {{
-      "A": "12",
-      "B": "14",
-      "C": "15",
-      "D": "16"
-    }},
-    "correct_answer": "C",
-    "topics": "Basic Mathematics",
-    "explanation": "9 + 6 equals 15, so option C is correct. The other options are common mistakes if someone adds incorrectly or forgets carrying over.",
-  }}
-]
+###
+REQUEST
+"""
+
+
+def prompt_func(text_extract, topic, difficulty, number_of_questions, avoid=None):
+    # Normalize topic for heading and JSON example snippets
+    if isinstance(topic, (list, tuple)):
+        topic_heading = ", ".join(str(t) for t in topic)
+        topics_json = json.dumps([str(t) for t in topic], ensure_ascii=False)
+    else:
+        topic_heading = str(topic)
+        topics_json = json.dumps([str(topic)], ensure_ascii=False)
+    # Questions already asked (e.g. on earlier pages of a quiz session)
+    avoid_block = ""
+    if avoid:
+        avoid_block = "- Do not repeat or rephrase any of these questions, they have already been asked:\n" + "".join(
+            f"  - {question}\n" for question in avoid)
+
+    # Only the request-specific tail changes between calls
+    promptstr = PROMPT_PREFIX + f"""
+### Topic : {topic_heading}
+- Use exactly this value for the "topics" field: {topics_json}
+- The difficulty level of the questions should be : {difficulty}
+- GIVE EXACTLY {number_of_questions} QUESTIONS in the array.
+{avoid_block}
+(The text extract starts after this line and ends when you encounter the exact phrase "ADAPTER TOOTHPASTE MEDICINE")
+{text_extract}
 
+ADAPTER TOOTHPASTE MEDICINE
 """
     return promptstr
 
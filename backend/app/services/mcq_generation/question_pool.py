@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from app.schemas.question import to_builtins, to_questions
+
+
+# Constants
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POOL_PATH = os.getenv("QUESTION_POOL_PATH", os.path.join(_BASE_DIR, "question_pool.sqlite3"))
+MAX_KEYS = 256  # (document, topic, difficulty) entries kept, least recently used evicted
+MAX_PER_KEY = 50
+BUSY_TIMEOUT = 10.0  # seconds to wait for another worker's write lock
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def _key(document, topic, difficulty):
+    return json.dumps([str(document), str(topic).strip().lower(), difficulty.lower()])
+
+
+class QuestionPool:
+    """
+    Already generated, not yet served questions per (document, topic, difficulty), in
+    SQLite so every worker process draws from the same pool. Questions are handed out at
+    most once, so a later request never repeats them.
+    """
+
+    def __init__(self, path=POOL_PATH, max_keys=MAX_KEYS, max_per_key=MAX_PER_KEY):
+        self.path = path
+        self.max_keys = max_keys
+        self.max_per_key = max_per_key
+        self._local = threading.local()
+
+    def _connection(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pooled_questions ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL,"
+                " question TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pooled_questions_key ON pooled_questions (key, id)")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never take the same rows
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def put(self, document, topic, difficulty, questions):
+        if not questions:
+            return
+        key = _key(document, topic, difficulty)
+        now = time.time()
+        try:
+            with self._transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO pooled_questions (key, question, last_used) VALUES (?, ?, ?)",
+                    [(key, json.dumps(item), now) for item in to_builtins(questions)],
+                )
+                conn.execute("UPDATE pooled_questions SET last_used = ? WHERE key = ?", (now, key))
+                # Keep the newest questions of the key and the most recently used keys
+                conn.execute(
+                    "DELETE FROM pooled_questions WHERE key = ? AND id NOT IN ("
+                    " SELECT id FROM pooled_questions WHERE key = ? ORDER BY id DESC LIMIT ?)",
+                    (key, key, self.max_per_key),
+                )
+                conn.execute(
+                    "DELETE FROM pooled_questions WHERE key IN ("
+                    " SELECT key FROM pooled_questions GROUP BY key"
+                    " ORDER BY MAX(last_used) DESC LIMIT -1 OFFSET ?)",
+                    (self.max_keys,),
+                )
+        except sqlite3.Error as e:
+            log(f"Question pool write failed: {e}")
+
+    def take(self, document, topic, difficulty, n):
+        """Remove and return up to `n` pooled questions."""
+        if n <= 0:
+            return []
+        key = _key(document, topic, difficulty)
+        try:
+            with self._transaction() as conn:
+                rows = conn.execute(
+                    "SELECT id, question FROM pooled_questions WHERE key = ? ORDER BY id LIMIT ?", (key, n)
+                ).fetchall()
+                if not rows:
+                    return []
+                conn.executemany("DELETE FROM pooled_questions WHERE id = ?", [(row[0],) for row in rows])
+                conn.execute("UPDATE pooled_questions SET last_used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            log(f"Question pool read failed: {e}")
+            return []
+        return to_questions([json.loads(row[1]) for row in rows])
+
+    def size(self, document, topic, difficulty):
+        try:
+            row = self._connection().execute(
+                "SELECT COUNT(*) FROM pooled_questions WHERE key = ?", (_key(document, topic, difficulty),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            log(f"Question pool read failed: {e}")
+            return 0
+        return row[0]
+
+
+# Shared by every generation in every worker
+question_pool = QuestionPool()
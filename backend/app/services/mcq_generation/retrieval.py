@@ -1,13 +1,29 @@
+import heapq
+import itertools
 import os
-import pickle
-import faiss
-from sentence_transformers import SentenceTransformer
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from app.services.metrics import tracer
+from app.services.models import embeddings
+from app.services.rag import course_store, topic_index, vector_store
 
-# Config (resolve paths relative to this file)
+# Config
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
-_BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "rag"))
-INDEX_PATH = os.path.join(_BASE_DIR, "vector_store", "index.faiss")
-METADATA_PATH = os.path.join(_BASE_DIR, "vector_store", "metadata.pkl")
+# Hybrid retrieval: each ranker contributes this many candidates per requested chunk
+CANDIDATES_PER_CHUNK = 4
+MIN_CANDIDATES = 20
+RRF_K = 60  # reciprocal rank fusion constant (Cormack et al.)
+# MMR re-selects the final chunks out of this many fused candidates per requested chunk
+MMR_CANDIDATES_PER_CHUNK = 3
+MMR_DIVERSITY = 0.5  # 0 = pure relevance, 1 = pure novelty
+# Course retrieval searches the document shards in parallel (faiss releases the GIL)
+SHARD_SEARCH_WORKERS = int(os.getenv("SHARD_SEARCH_WORKERS", "8"))
+
+# Per-worker cache of the live index generation; reloaded when a new one is published
+_index_cache = {"generation": None, "index": None, "metadata": None, "topic_map": None}
+_index_cache_lock = threading.Lock()
+_shard_executor = ThreadPoolExecutor(max_workers=SHARD_SEARCH_WORKERS, thread_name_prefix="shard-search")
 
 # Difficulty transformation
 
@@ -36,34 +52,194 @@ def generate_query(topic: str, difficulty: str, topic_description: str = "") ->
 
 
 # Load FAISS and metadata
-def load_faiss_index_and_metadata(index_path: str, metadata_path: str):
+def get_index_and_metadata():
+    """
+    Return the live (index, metadata), loading it only when the published generation
+    differs from the one this worker already holds.
+    """
+    generation = vector_store.current_generation()
+    with _index_cache_lock:
+        if _index_cache["index"] is None or _index_cache["generation"] != generation:
+            print(f"Loading index generation {generation}...")
+            loaded_generation, index, metadata = vector_store.load()
+            _index_cache.update(generation=loaded_generation, index=index, metadata=metadata, topic_map=None)
+            try:
+                print(f"The metadata has been extracted: length = {len(metadata.get('chunks', []))}")
+            except Exception:
+                pass
+        return _index_cache["index"], _index_cache["metadata"]
+
+
+def get_topic_map():
     """
-    Load FAISS index and metadata list from disk.
+    Topic -> chunk postings of the cached generation. Written after the generation is
+    published (once topic extraction finishes), so a missing map is looked for again.
     """
-    index = faiss.read_index(index_path)
-    with open(metadata_path, "rb") as f:
-        metadata = pickle.load(f)
-    try:
-        print(f"The metadata has been extracted: length = {len(metadata.get('chunks', []))}")
-    except Exception:
-        pass
-    return index, metadata
+    with _index_cache_lock:
+        if _index_cache["topic_map"] is None and _index_cache["index"] is not None:
+            _index_cache["topic_map"] = topic_index.load(_index_cache["generation"])
+        return _index_cache["topic_map"] or {}
 
 
 # Retrieval
-def retrieve_top_k(query: str, index, metadata, k: int, model):
+def dense_ranking(query_embedding, index, k: int):
+    """Chunk ids of the k nearest chunks to the query embedding, best first."""
+    _, indices = index.search(query_embedding, min(k, index.ntotal))
+    return [int(idx) for idx in indices[0] if idx >= 0]
+
+
+def reciprocal_rank_fusion(rankings, k: int):
+    """
+    Fuse several rankings of chunk ids: score(id) = sum over rankings of 1 / (RRF_K + rank).
+    Returns the k best (chunk_id, score) pairs.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def chunk_vectors(index, metadata, chunk_ids):
+    """Embeddings of the given chunks: from the stored float16 matrix, else rebuilt from the index."""
+    stored = metadata.get("embeddings")
+    if stored is not None:
+        return np.asarray(stored[chunk_ids], dtype=np.float32)
+    return np.vstack([index.reconstruct(chunk_id) for chunk_id in chunk_ids]).astype(np.float32)
+
+
+def mmr_select(relevance, vectors, k: int, diversity: float = MMR_DIVERSITY):
+    """
+    Maximal Marginal Relevance: repeatedly pick the candidate maximizing
+    (1 - diversity) * relevance - diversity * (max cosine similarity to those already picked).
+    Returns positions into `vectors`, in pick order.
+    """
+    n = len(vectors)
+    if n <= k:
+        return list(range(n))
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ vectors.T
+    relevance = np.asarray(relevance, dtype=np.float32)
+    relevance = relevance / (relevance.max() or 1.0)
+
+    selected = [int(np.argmax(relevance))]
+    closest = similarity[selected[0]].copy()
+    while len(selected) < k:
+        scores = (1 - diversity) * relevance - diversity * closest
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(closest, similarity[best], out=closest)
+    return selected
+
+
+def retrieve_by_topic(postings, index, metadata, k: int):
+    """
+    Retrieve K chunks straight from a topic's posting list (chunk ids ranked at ingest),
+    with the same MMR selection as search but without embedding a query. Relevance is
+    taken from the posting rank, like in reciprocal rank fusion.
+    """
+    chunks = metadata["chunks"]
+    candidate_ids = [chunk_id for chunk_id, _ in postings[:MMR_CANDIDATES_PER_CHUNK * k] if chunk_id < len(chunks)]
+    if not candidate_ids:
+        return []
+    picked = mmr_select(
+        [1.0 / (RRF_K + rank) for rank in range(1, len(candidate_ids) + 1)],
+        chunk_vectors(index, metadata, candidate_ids), k)
+    return [chunks[candidate_ids[i]] for i in picked]
+
+
+def retrieve_hybrid(query: str, lexical_query: str, index, metadata, k: int):
+    """
+    Retrieve K chunks: fuse dense search on the query with BM25 on the exact terms of
+    `lexical_query` (so chunks that contain the technical term are not missed), then
+    pick a diverse subset of the fused candidates with MMR so near-duplicate chunks do
+    not take up the prompt. Generations built without a BM25 index use dense search only.
+    """
+    chunks = metadata["chunks"]
+    bm25 = metadata.get("bm25")
+
+    query_embedding = embeddings.encode([query])
+    pool = max(MIN_CANDIDATES, CANDIDATES_PER_CHUNK * k)
+    rankings = [dense_ranking(query_embedding, index, pool)]
+    if bm25 is not None:
+        rankings.append([chunk_id for chunk_id, _ in bm25.search(lexical_query, pool)])
+    fused = [
+        (chunk_id, score)
+        for chunk_id, score in reciprocal_rank_fusion(rankings, MMR_CANDIDATES_PER_CHUNK * k)
+        if chunk_id < len(chunks)
+    ]
+    if not fused:
+        return []
+
+    candidate_ids = [chunk_id for chunk_id, _ in fused]
+    picked = mmr_select(
+        [score for _, score in fused], chunk_vectors(index, metadata, candidate_ids), k)
+    return [chunks[candidate_ids[i]] for i in picked]
+
+
+def shard_candidates(shard, query_embedding, lexical_query: str, k: int):
+    """
+    One shard's candidates, best first: dense (distance, chunk_id) pairs and BM25
+    (-score, chunk_id) pairs, so that both lists sort ascending.
+    """
+    distances, indices = shard.index.search(query_embedding, min(k, shard.index.ntotal))
+    dense = [(float(distance), int(idx)) for distance, idx in zip(distances[0], indices[0]) if idx >= 0]
+    bm25 = shard.metadata.get("bm25")
+    lexical = [(-score, chunk_id) for chunk_id, score in bm25.search(lexical_query, k)] if bm25 is not None else []
+    return dense, lexical
+
+
+def merge_top_k(per_shard, k: int):
+    """
+    Global top k of per-shard candidate lists that are each sorted ascending, as
+    (document_id, chunk_id) keys: a k-way heap merge that stops after k items.
+    """
+    merged = heapq.merge(*(
+        [(value, document_id, chunk_id) for value, chunk_id in candidates]
+        for document_id, candidates in per_shard
+    ))
+    return [(document_id, chunk_id) for _, document_id, chunk_id in itertools.islice(merged, k)]
+
+
+def retrieve_course(query: str, lexical_query: str, course_id: str, k: int, documents=None):
     """
-    Retrieve top K chunks for a given query string.
+    Retrieve K chunks from a course corpus (one index shard per document; all of them
+    unless `documents` restricts it). Every shard is searched in parallel, the per-shard
+    dense and BM25 lists are merged into global top lists (L2 distances share one
+    embedding space; BM25 scores use each shard's own statistics), and the result goes
+    through the same fusion and MMR selection as single-document retrieval.
     """
-    query_embedding = model.encode([query])
-    distances, indices = index.search(query_embedding, k)
+    document_ids = list(documents) if documents else course_store.list_documents(course_id)
+    if not document_ids:
+        return []
+    query_embedding = embeddings.encode([query])
+    pool = max(MIN_CANDIDATES, CANDIDATES_PER_CHUNK * k)
+
+    def search(document_id):
+        shard = course_store.shards.get(course_id, document_id)
+        return shard, shard_candidates(shard, query_embedding, lexical_query, pool)
+
+    if len(document_ids) == 1:
+        results = [search(document_ids[0])]
+    else:
+        results = list(_shard_executor.map(search, document_ids))
+    shards = {shard.document_id: shard for shard, _ in results}
 
-    # Extract matching chunks from metadata
-    results = []
-    for idx in indices[0]:
-        if idx < len(metadata):
-            results.append(metadata[idx])
-    return results
+    rankings = [merge_top_k([(shard.document_id, dense) for shard, (dense, _) in results], pool)]
+    lexical = merge_top_k([(shard.document_id, lexical) for shard, (_, lexical) in results], pool)
+    if lexical:
+        rankings.append(lexical)
+    fused = reciprocal_rank_fusion(rankings, MMR_CANDIDATES_PER_CHUNK * k)
+    if not fused:
+        return []
+
+    vectors = np.vstack([
+        chunk_vectors(shards[document_id].index, shards[document_id].metadata, [chunk_id])
+        for (document_id, chunk_id), _ in fused
+    ])
+    picked = mmr_select([score for _, score in fused], vectors, k)
+    return [shards[fused[i][0][0]].metadata["chunks"][fused[i][0][1]] for i in picked]
 
 
 # Group into paragraphs
@@ -78,30 +254,39 @@ def group_into_string(chunks_list):
         paragraphs.append(chunks_list[i-1])
         paragraphs.append("\n\n")
         i += 1
-    print(paragraphs)
     string_final = ''.join(paragraphs)
     return string_final
 
 
 # Main pipeline
-def main(topic: str, difficulty: str, k: int, topic_description: str = ""):
+def main(topic: str, difficulty: str, k: int, topic_description: str = "", course_id=None, documents=None):
     print("RETRIEVAL: Generating query based on the given input")
     # Step 1: Generate query
     query = generate_query(topic, difficulty, topic_description)
 
-    # Step 2: Load FAISS index + metadata
-    print("Reading the index and metadata file...")
-    index, metadata = load_faiss_index_and_metadata(INDEX_PATH, METADATA_PATH)
-
-    # Step 3: Load embedding model
-    print("Loading the embedding model...")
-    model = SentenceTransformer(EMBED_MODEL_NAME)
+    if course_id is not None:
+        # Steps 2-3 for a course corpus: fan out over the (selected) document shards
+        print(f"Retrieving top {k} chunks from course {course_id}...")
+        top_chunks = retrieve_course(query, topic, course_id, k, documents)
+    else:
+        # Step 2: Load FAISS index + metadata (cached per index generation)
+        index, metadata = get_index_and_metadata()
 
-    # Step 4: Retrieve top K chunks
-    print(f"Retrieving top {k} chunks...")
-    top_chunks = retrieve_top_k(query, index, metadata["chunks"], k, model)
+        # Step 3: Extracted topics with enough chunks linked at ingest are fetched directly;
+        # free-form topics retrieve the top K chunks by fusing dense search (the query is
+        # embedded by the shared embedding server when one is configured) with BM25 on the
+        # topic's own terms
+        entry = get_topic_map().get(topic_index.topic_key(topic))
+        if entry and len(entry["chunks"]) >= k:
+            print(f"Fetching {k} chunks linked to topic '{topic}'...")
+            tracer.increment("retrieval_total", "path", "topic_map")
+            top_chunks = retrieve_by_topic(entry["chunks"], index, metadata, k)
+        else:
+            print(f"Retrieving top {k} chunks...")
+            tracer.increment("retrieval_total", "path", "search")
+            top_chunks = retrieve_hybrid(query, topic, index, metadata, k)
 
-    # Step 5: Group into paragraphs
+    # Step 4: Group into paragraphs
     print("Grouping text...")
     text = group_into_string(top_chunks)
 
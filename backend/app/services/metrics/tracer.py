@@ -0,0 +1,183 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Constants
+# Histogram bucket upper bounds in seconds (LLM calls can take minutes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# Set SERVER_TIMING_HEADER=0 to stop returning the per-request breakdown
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_HEADER", "1") != "0"
+
+
+class Histogram:
+    """Cumulative Prometheus-style histogram for one label value."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+
+class Trace:
+    """Spans recorded while serving a single request."""
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.spans.append((name, seconds))
+
+    def totals(self):
+        """Return {stage: (total_seconds, count)} in first-seen order."""
+        totals = {}
+        with self._lock:
+            for name, seconds in self.spans:
+                total, count = totals.get(name, (0.0, 0))
+                totals[name] = (total + seconds, count + 1)
+        return totals
+
+
+# name -> {label value -> Histogram}
+_families = {
+    "pipeline_stage_seconds": ("stage", {}),
+    "http_request_duration_seconds": ("route", {}),
+}
+# name -> (label name, {label value -> count})
+_counters = {}
+_families_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def observe(family, label_name, label_value, seconds):
+    """Add an observation to a histogram family, creating the family on first use."""
+    with _families_lock:
+        _, histograms = _families.setdefault(family, (label_name, {}))
+        histogram = histograms.get(label_value)
+        if histogram is None:
+            histogram = histograms[label_value] = Histogram()
+    histogram.observe(seconds)
+
+
+# ----------------------------
+# Request traces
+# ----------------------------
+def start_trace():
+    """Attach a fresh trace to the current context. Returns (trace, token)."""
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def record(stage, seconds):
+    """Record a finished stage in the global histogram and the current request trace."""
+    observe("pipeline_stage_seconds", "stage", stage, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+def record_request(route, seconds):
+    observe("http_request_duration_seconds", "route", route, seconds)
+
+
+def increment(name, label_name, label_value, amount=1):
+    """Add to a Prometheus counter, e.g. increment("llm_retries_total", "call_site", "mcq")."""
+    with _families_lock:
+        _, values = _counters.setdefault(name, (label_name, {}))
+        values[label_value] = values.get(label_value, 0) + amount
+
+
+def counter_value(name, label_value):
+    with _families_lock:
+        return _counters.get(name, (None, {}))[1].get(label_value, 0)
+
+
+@contextmanager
+def span(stage):
+    """Time the wrapped block as one pipeline stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def record_ollama(result):
+    """
+    Record Ollama's own timing fields (nanoseconds) for a finished call. Works for the
+    raw /api/generate JSON and for the response objects of the ollama client.
+    """
+    if not result:
+        return
+    prompt_eval = result.get("prompt_eval_duration")
+    generation = result.get("eval_duration")
+    if prompt_eval:
+        record("llm_prompt_eval", prompt_eval / 1e9)
+    if generation:
+        record("llm_generation", generation / 1e9)
+
+
+# ----------------------------
+# Exposition
+# ----------------------------
+def server_timing(trace):
+    """Format a trace as a Server-Timing header value (durations in milliseconds)."""
+    parts = []
+    for stage, (total, count) in trace.totals().items():
+        parts.append(f'{stage};dur={total * 1000:.1f};desc="{count}x"')
+    return ", ".join(parts)
+
+
+def render_prometheus():
+    """Render all histograms and counters in the Prometheus text exposition format."""
+    lines = []
+    with _families_lock:
+        families = {
+            name: (label_name, dict(histograms))
+            for name, (label_name, histograms) in _families.items()
+        }
+        counters = {
+            name: (label_name, dict(values))
+            for name, (label_name, values) in _counters.items()
+        }
+    for name, (label_name, histograms) in families.items():
+        lines.append(f"# TYPE {name} histogram")
+        for label_value, histogram in sorted(histograms.items()):
+            counts, total, count = histogram.snapshot()
+            label = f'{label_name}="{label_value}"'
+            for bound, bucket_count in zip(histogram.buckets, counts):
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {bucket_count}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{label}}} {total}")
+            lines.append(f"{name}_count{{{label}}} {count}")
+    for name, (label_name, values) in sorted(counters.items()):
+        lines.append(f"# TYPE {name} counter")
+        for label_value, value in sorted(values.items()):
+            lines.append(f'{name}{{{label_name}="{label_value}"}} {value}')
+    return "\n".join(lines) + "\n"
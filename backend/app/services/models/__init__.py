@@ -0,0 +1 @@
+# Shared model loaders
@@ -0,0 +1,143 @@
+"""
+Shared embedding server: one MiniLM instance serving every worker over a Unix socket.
+
+Concurrent encode requests from all connections are gathered into micro-batches (up to
+MAX_BATCH texts, waiting at most MAX_WAIT_MS after the first one) and encoded in one
+model call. Results go back as raw float32 matrices (see embeddings.py for the format).
+
+Usage (from backend/):
+    EMBEDDING_SOCKET=/tmp/embeddings.sock python -m app.services.models.embedding_server
+"""
+import asyncio
+import json
+import os
+import time
+import numpy as np
+from app.services.models import loader
+from app.services.models.embeddings import ERROR_ROWS, HEADER, MATRIX_HEADER
+
+
+# Constants
+SOCKET_PATH = loader.EMBEDDING_SOCKET or "/tmp/mcq-embeddings.sock"
+MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "64"))
+MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+class MicroBatcher:
+    """Collects (texts, normalize, future) requests and encodes them in shared batches."""
+
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait=MAX_WAIT_MS / 1000):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.texts = 0
+
+    async def submit(self, texts, normalize):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((texts, normalize, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _encode(self, batch):
+        # Normalization is per request, so encode raw and normalize rows afterwards
+        texts = [text for item_texts, _, _ in batch for text in item_texts]
+        matrix = np.asarray(self.model.encode(texts, batch_size=self.max_batch, convert_to_numpy=True),
+                            dtype=np.float32)
+        results, start = [], 0
+        for item_texts, normalize, _ in batch:
+            rows = matrix[start:start + len(item_texts)]
+            if normalize:
+                rows = rows / np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+            results.append(np.ascontiguousarray(rows, dtype=np.float32))
+            start += len(item_texts)
+        return results
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            try:
+                # One encode at a time, off the event loop so new requests keep queueing
+                results = await loop.run_in_executor(None, self._encode, batch)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += sum(len(item[0]) for item in batch)
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+async def handle_connection(batcher, reader, writer):
+    try:
+        while True:
+            try:
+                (length,) = HEADER.unpack(await reader.readexactly(HEADER.size))
+                request = json.loads(await reader.readexactly(length))
+            except asyncio.IncompleteReadError:
+                return
+            try:
+                matrix = await batcher.submit(request["texts"], bool(request.get("normalize")))
+            except Exception as e:
+                message = str(e).encode("utf-8")
+                writer.write(MATRIX_HEADER.pack(ERROR_ROWS, len(message)) + message)
+            else:
+                rows, dim = matrix.shape
+                writer.write(MATRIX_HEADER.pack(rows, dim))
+                # The array's own buffer, no tobytes() copy
+                writer.write(memoryview(matrix).cast("B"))
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def serve(path=SOCKET_PATH):
+    model = loader.get_embedder()
+    batcher = MicroBatcher(model)
+    if os.path.exists(path):
+        os.remove(path)
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: handle_connection(batcher, reader, writer), path=path)
+    os.chmod(path, 0o660)
+    log(f"Embedding server listening on {path} (batch {batcher.max_batch}, wait {MAX_WAIT_MS} ms)")
+    async with server:
+        await asyncio.gather(server.serve_forever(), batcher.run())
+
+
+def main():
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import json
+import socket
+import struct
+import threading
+import time
+import numpy as np
+from app.services.metrics import tracer
+from app.services.models import loader
+
+
+# Wire format (Unix stream socket, one request at a time per connection):
+#   request:  u32 length | JSON {"texts": [...], "normalize": bool}
+#   response: u32 rows | u32 dim | rows * dim float32 (native byte order)
+#   error:    u32 ERROR_ROWS | u32 length | UTF-8 message
+HEADER = struct.Struct("!I")
+MATRIX_HEADER = struct.Struct("!II")
+ERROR_ROWS = 0xFFFFFFFF
+
+# Constants
+CONNECT_TIMEOUT = 2.0
+REQUEST_TIMEOUT = 120.0
+RETRY_SERVER_AFTER = 30.0  # seconds of in-process fallback before trying the server again
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def recv_exactly(sock, size):
+    """Read exactly `size` bytes into a fresh buffer (no intermediate copies)."""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Embedding server closed the connection")
+        received += n
+    return buffer
+
+
+class EmbeddingClient:
+    """Client of the embedding server; one persistent connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(CONNECT_TIMEOUT)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            sock.settimeout(REQUEST_TIMEOUT)
+            self._local.sock = sock
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def encode(self, texts, normalize=False):
+        payload = json.dumps({"texts": list(texts), "normalize": normalize}).encode("utf-8")
+        try:
+            sock = self._connection()
+            sock.sendall(HEADER.pack(len(payload)) + payload)
+            rows, dim = MATRIX_HEADER.unpack(recv_exactly(sock, MATRIX_HEADER.size))
+            if rows == ERROR_ROWS:
+                raise RuntimeError(recv_exactly(sock, dim).decode("utf-8"))
+            body = recv_exactly(sock, rows * dim * 4)
+        except BaseException:
+            # The stream may be mid-frame; never reuse it
+            self.close()
+            raise
+        # Wraps the received buffer without copying it
+        return np.frombuffer(body, dtype=np.float32).reshape(rows, dim)
+
+
+_client = EmbeddingClient(loader.EMBEDDING_SOCKET) if loader.EMBEDDING_SOCKET else None
+_server_down_until = 0.0
+
+
+def encode_local(texts, normalize=False):
+    model = loader.get_embedder()
+    return np.asarray(
+        model.encode(list(texts), normalize_embeddings=normalize, convert_to_numpy=True),
+        dtype=np.float32,
+    )
+
+
+def encode(texts, normalize=False):
+    """
+    Embed `texts` as a (len(texts), dim) float32 matrix, through the shared embedding
+    server when EMBEDDING_SOCKET is set, falling back to an in-process model if the
+    server cannot be reached.
+    """
+    global _server_down_until
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    if _client is not None and time.monotonic() >= _server_down_until:
+        try:
+            return _client.encode(texts, normalize)
+        except (OSError, ConnectionError) as e:
+            _server_down_until = time.monotonic() + RETRY_SERVER_AFTER
+            tracer.increment("embedding_server_fallbacks_total", "reason", type(e).__name__)
+            log(f"Embedding server unavailable ({e}), encoding in-process for {RETRY_SERVER_AFTER:.0f}s")
+    return encode_local(texts, normalize)
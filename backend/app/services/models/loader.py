@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+
+
+# Constants
+EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+SPACY_MODEL_NAME = "en_core_web_sm"
+# Unix socket of the shared embedding server (python -m app.services.models.embedding_server).
+# When set, workers send texts there instead of loading their own copy of the model.
+EMBEDDING_SOCKET = os.getenv("EMBEDDING_SOCKET")
+
+# Loaded objects, keyed by (kind, name). Heavy libraries (spaCy, torch, transformers,
+# faiss) are only imported the first time something asks for them.
+_cache = {}
+_lock = threading.Lock()
+
+
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def _get(key, load):
+    value = _cache.get(key)
+    if value is None:
+        with _lock:
+            value = _cache.get(key)
+            if value is None:
+                start = time.perf_counter()
+                value = _cache[key] = load()
+                log(f"Loaded {key[0]} '{key[1]}' in {time.perf_counter() - start:.2f} seconds")
+    return value
+
+
+def get_spacy(name=SPACY_MODEL_NAME):
+    def load():
+        import spacy
+        return spacy.load(name)
+    return _get(("spacy", name), load)
+
+
+def get_embedder(name=EMBED_MODEL_NAME):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+    return _get(("embedder", name), load)
+
+
+def get_tokenizer(name=EMBED_MODEL_NAME):
+    def load():
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(name, use_fast=True)
+    return _get(("tokenizer", name), load)
+
+
+def get_translator(name):
+    """MarianMT tokenizer and model for one language pair, int8 dynamically quantized for CPU."""
+    def load():
+        import torch
+        from transformers import MarianMTModel, MarianTokenizer
+        tokenizer = MarianTokenizer.from_pretrained(name)
+        model = MarianMTModel.from_pretrained(name).eval()
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return tokenizer, model
+    return _get(("translator", name), load)
+
+
+def get_faiss():
+    def load():
+        import faiss
+        return faiss
+    return _get(("module", "faiss"), load)
+
+
+def warm_up():
+    """
+    Load every model used on the request path. Only weights are loaded, no inference is
+    run, so no torch/OpenMP thread pools exist yet if the process forks afterwards.
+    """
+    start = time.perf_counter()
+    get_faiss()
+    get_tokenizer()
+    # Parses noun phrases for the fast topic mode and topic keyword cleanup
+    get_spacy()
+    if not EMBEDDING_SOCKET:
+        get_embedder()
+    log(f"Warm-up finished in {time.perf_counter() - start:.2f} seconds")
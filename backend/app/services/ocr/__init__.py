@@ -0,0 +1 @@
+# Selective OCR of scanned PDF pages
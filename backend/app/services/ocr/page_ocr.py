@@ -0,0 +1,186 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import fitz  # PyMuPDF
+from app.services.metrics import tracer
+from app.services.storage.file_store import atomic_write
+
+
+# Constants
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(_BASE_DIR, "cache"))
+# Set OCR_ENABLED=0 to only ever read the embedded text layer
+OCR_ENABLED = os.getenv("OCR_ENABLED", "1") != "0"
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_DPI = 300
+# Every web worker has its own pool (see gunicorn.conf.py), so they split the CPUs
+WEB_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, ((os.cpu_count() or 2) - 1) // WEB_WORKERS))))
+# Page classification: fewer characters than this in the text layer means "no text"
+MIN_TEXT_CHARS = 40
+# ...and less than this share of letters, digits and whitespace means "garbage text"
+MIN_CLEAN_RATIO = 0.6
+# Pages whose images cover less than this share of the page are not worth OCR-ing...
+MIN_IMAGE_COVERAGE = 0.3
+# ...unless they draw this many vector paths (text exported as outlines)
+MIN_DRAWINGS = 100
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def clean_ratio(text):
+    if not text:
+        return 0.0
+    clean = sum(1 for ch in text if ch.isalnum() or ch.isspace() or ch in ".,;:!?'\"()-")
+    return clean / len(text)
+
+
+def image_coverage(page):
+    area = abs(page.rect) or 1.0
+    covered = 0.0
+    for info in page.get_image_info():
+        covered += abs(fitz.Rect(info["bbox"]) & page.rect)
+    return min(1.0, covered / area)
+
+
+def needs_ocr(page, text):
+    """
+    True for scanned pages: no (or garbage) text layer, but mostly covered by images or
+    drawn as vector outlines. Blank pages and simple figures are left alone.
+    """
+    stripped = text.strip()
+    if len(stripped) >= MIN_TEXT_CHARS and clean_ratio(stripped) >= MIN_CLEAN_RATIO:
+        return False
+    return image_coverage(page) >= MIN_IMAGE_COVERAGE or len(page.get_cdrawings()) >= MIN_DRAWINGS
+
+
+def page_hash(doc, page):
+    """Hash of what the page draws: its content streams and the raw bytes of its images."""
+    digest = hashlib.sha256()
+    digest.update(page.read_contents())
+    for image in page.get_images(full=True):
+        digest.update(doc.xref_stream_raw(image[0]) or b"")
+    digest.update(f"{OCR_LANGUAGE}:{OCR_DPI}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+# ----------------------------
+# Cache (one text file per page hash, shared by all workers)
+# ----------------------------
+def cache_path(key):
+    return os.path.join(OCR_CACHE_DIR, key[:2], f"{key}.txt")
+
+
+def cache_get(key):
+    try:
+        with open(cache_path(key), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def cache_put(key, text):
+    atomic_write(cache_path(key), text)
+
+
+# ----------------------------
+# OCR workers
+# ----------------------------
+def ocr_page(pdf_path, page_number, tessdata, language=OCR_LANGUAGE, dpi=OCR_DPI):
+    """Run in a pool process: render one page and OCR it with Tesseract."""
+    with fitz.open(pdf_path) as doc:
+        page = doc[page_number]
+        textpage = page.get_textpage_ocr(language=language, dpi=dpi, full=True, tessdata=tessdata)
+        return page.get_text(textpage=textpage)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the server process has threads, forking it is not safe
+            _pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+@lru_cache(maxsize=1)
+def tessdata_path():
+    """
+    The Tesseract language data folder PyMuPDF uses (TESSDATA_PREFIX or the installed
+    Tesseract's), if it has every language in OCR_LANGUAGE; None otherwise.
+    """
+    try:
+        path = fitz.get_tessdata()
+    except Exception:
+        return None
+    languages = OCR_LANGUAGE.split("+")
+    if not path or not all(os.path.exists(os.path.join(path, f"{lang}.traineddata")) for lang in languages):
+        log(f"Tesseract language data for '{OCR_LANGUAGE}' not found (tessdata: {path}), OCR disabled")
+        return None
+    return path
+
+
+def ocr_available():
+    return OCR_ENABLED and tessdata_path() is not None
+
+
+# ----------------------------
+# Text extraction
+# ----------------------------
+def extract_pages(pdf_path):
+    """
+    Text of every page: the embedded text layer where it is usable, Tesseract OCR for
+    scanned pages (run in parallel in a process pool, cached by page hash).
+    """
+    with fitz.open(pdf_path) as doc:
+        pages = []
+        pending = {}  # page number -> cache key
+        for page in doc:
+            text = page.get_text()
+            pages.append(text)
+            if needs_ocr(page, text):
+                pending[page.number] = page_hash(doc, page)
+
+    if not pending:
+        return pages
+    if not ocr_available():
+        log(f"{len(pending)} scanned pages without a usable text layer, but Tesseract is not available")
+        return pages
+
+    with tracer.span("ocr"):
+        futures = {}
+        hits = 0
+        for page_number, key in pending.items():
+            cached = cache_get(key)
+            if cached is not None:
+                pages[page_number] = cached
+                hits += 1
+            else:
+                futures[page_number] = get_pool().submit(ocr_page, pdf_path, page_number, tessdata_path())
+        for page_number, future in futures.items():
+            try:
+                text = future.result()
+            except Exception as e:
+                # The page keeps its text layer
+                log(f"OCR failed on page {page_number + 1}: {e}")
+                continue
+            pages[page_number] = text
+            cache_put(pending[page_number], text)
+    tracer.increment("ocr_pages_total", "source", "cache", hits)
+    tracer.increment("ocr_pages_total", "source", "tesseract", len(futures))
+    log(f"OCR: {len(pending)} scanned pages, {hits} from cache, {len(futures)} recognized")
+    return pages
+
+
+def extract_text(pdf_path):
+    return "".join(extract_pages(pdf_path))
@@ -0,0 +1 @@
+# Paged quiz sessions: questions generated as the student progresses
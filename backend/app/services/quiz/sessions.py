@@ -0,0 +1,268 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from app.services.llm.scheduler import set_request_context
+from app.services.llm.singleflight import Singleflight
+from app.schemas.question import to_builtins
+from app.services.mcq_generation.mcq_generator import generate_mcqs
+from app.services.metrics import tracer
+from app.services.storage.file_store import atomic_write_json, file_lock
+
+
+# Layout: one JSON file (plus its lock files) per quiz session, shared by all workers
+#   quiz_sessions/<session_id>.json
+#   quiz_sessions/.<session_id>.lock         held while the session file is updated
+#   quiz_sessions/.<session_id>.p<page>.lock held while the page is generated
+_BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+QUIZ_SESSIONS_DIR = os.getenv("QUIZ_SESSIONS_DIR", os.path.join(_BASE_DIR, "quiz_sessions"))
+SESSION_TTL_SECONDS = int(os.getenv("QUIZ_SESSION_TTL_HOURS", "24")) * 3600
+PRUNE_INTERVAL_SECONDS = 600
+LOOKAHEAD_PAGES = 1
+# Rounds of generation for the slots of a page left empty by dropped duplicates
+MAX_PAGE_ATTEMPTS = 3
+# Most recent questions of the session passed to the prompt as ones not to repeat
+MAX_AVOID_QUESTIONS = 30
+
+# Concurrent requests for the same page in this worker (e.g. the lookahead and the
+# student catching up with it) share one generation; the page lock covers other workers
+page_flights = Singleflight("quiz_pages")
+_last_prune = [0.0]
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+def session_path(session_id):
+    return os.path.join(QUIZ_SESSIONS_DIR, f"{session_id}.json")
+
+
+def lock_path(session_id):
+    return os.path.join(QUIZ_SESSIONS_DIR, f".{session_id}.lock")
+
+
+def page_lock_path(session_id, page):
+    return os.path.join(QUIZ_SESSIONS_DIR, f".{session_id}.p{page}.lock")
+
+
+def valid_session_id(session_id):
+    # Session ids become file names: uuid4 hex only
+    return len(session_id) == 32 and all(ch in "0123456789abcdef" for ch in session_id)
+
+
+def plan_slots(plan):
+    """
+    One (topic, difficulty) slot per question, interleaving the plan's items round-robin
+    so that every page covers several topics.
+    """
+    remaining = [[item["topic"], item["difficulty"], item["count"]] for item in plan]
+    slots = []
+    while any(count > 0 for _, _, count in remaining):
+        for item in remaining:
+            if item[2] > 0:
+                slots.append([item[0], item[1]])
+                item[2] -= 1
+    return slots
+
+
+# ----------------------------
+# Storage
+# ----------------------------
+def load(session_id):
+    try:
+        with open(session_path(session_id), "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except FileNotFoundError:
+        raise SessionNotFound(session_id)
+    if time.time() - session["created_at"] > SESSION_TTL_SECONDS:
+        raise SessionNotFound(session_id)
+    return session
+
+
+def save(session):
+    atomic_write_json(session_path(session["id"]), session)
+
+
+def prune_expired():
+    """Remove expired sessions, at most once per PRUNE_INTERVAL_SECONDS per worker."""
+    now = time.time()
+    if now - _last_prune[0] < PRUNE_INTERVAL_SECONDS or not os.path.isdir(QUIZ_SESSIONS_DIR):
+        return
+    _last_prune[0] = now
+    names = os.listdir(QUIZ_SESSIONS_DIR)
+    for name in names:
+        path = os.path.join(QUIZ_SESSIONS_DIR, name)
+        if name.endswith(".json") and now - os.path.getmtime(path) > SESSION_TTL_SECONDS:
+            lock_prefix = f".{name[:-len('.json')]}."
+            for stale in [name] + [other for other in names if other.startswith(lock_prefix)]:
+                stale_path = os.path.join(QUIZ_SESSIONS_DIR, stale)
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+
+
+def page_count(session):
+    return -(-len(session["slots"]) // session["page_size"])
+
+
+def page_slots(session, page):
+    return session["slots"][page * session["page_size"]:(page + 1) * session["page_size"]]
+
+
+def stem_key(question_text):
+    return " ".join(str(question_text).lower().split())
+
+
+def asked_questions(session):
+    """Question texts of the pages stored so far, in page order."""
+    return [
+        question["question"]
+        for page in sorted(session["pages"], key=int)
+        for question in session["pages"][page]
+    ]
+
+
+def summary(session):
+    return {
+        "session_id": session["id"],
+        "total_questions": len(session["slots"]),
+        "page_size": session["page_size"],
+        "total_pages": page_count(session),
+        "generated_pages": sorted(int(page) for page in session["pages"]),
+    }
+
+
+# ----------------------------
+# Sessions and pages
+# ----------------------------
+def create_session(plan, page_size, course_id=None, documents=None):
+    """
+    Persist a new session for `plan` ([{topic, count, difficulty}, ...]). No question is
+    generated here; pages are generated when they are first requested.
+    """
+    prune_expired()
+    session = {
+        "id": uuid.uuid4().hex,
+        "created_at": time.time(),
+        "plan": plan,
+        "slots": plan_slots(plan),
+        "page_size": page_size,
+        "course_id": course_id,
+        "documents": documents,
+        "pages": {},
+    }
+    save(session)
+    log(f"Created quiz session {session['id']}: {len(session['slots'])} questions, {page_count(session)} pages")
+    return session
+
+
+def generate_page(session, page):
+    """
+    Generate the questions of one page, in slot order, one generation call per topic and
+    difficulty. The questions already asked in the session are passed to the prompt, and
+    any that come back anyway are dropped and their slots generated again (up to
+    MAX_PAGE_ATTEMPTS rounds). Returns the questions; slots that stay empty are skipped.
+    """
+    slots = page_slots(session, page)
+    asked = asked_questions(session)
+    seen = {stem_key(text) for text in asked}
+    filled = [None] * len(slots)
+    for _ in range(MAX_PAGE_ATTEMPTS):
+        wanted = {}
+        for position, (topic, difficulty) in enumerate(slots):
+            if filled[position] is None:
+                wanted.setdefault((topic, difficulty), []).append(position)
+        if not wanted:
+            break
+        for (topic, difficulty), positions in wanted.items():
+            batch = generate_mcqs(
+                difficulty, len(positions), [topic],
+                course_id=session["course_id"], documents=session["documents"],
+                avoid=asked[-MAX_AVOID_QUESTIONS:])
+            fresh = []
+            for question in batch:
+                key = stem_key(question.question)
+                if key in seen:
+                    tracer.increment("quiz_duplicate_questions_total", "stage", "generate")
+                    continue
+                seen.add(key)
+                asked.append(question.question)
+                fresh.append(question)
+            for position, question in zip(positions, fresh):
+                filled[position] = question
+    # Stored in the session JSON
+    return to_builtins([question for question in filled if question is not None])
+
+
+def get_page(session_id, page):
+    """
+    Questions of `page`: read from the session if already generated, otherwise generated
+    now (coalesced with any in-flight generation of the same page) and stored.
+    """
+    session = load(session_id)
+    stored = session["pages"].get(str(page))
+    if stored is not None:
+        tracer.increment("quiz_pages_total", "source", "stored")
+        return session, stored
+    questions = page_flights.do(f"{session_id}:{page}", lambda: _generate_and_store(session_id, page))
+    return load(session_id), questions
+
+
+def _generate_and_store(session_id, page):
+    # One generation per page across workers: the others wait here, then read the stored page
+    with file_lock(page_lock_path(session_id, page)):
+        session = load(session_id)
+        stored = session["pages"].get(str(page))
+        if stored is not None:
+            return stored
+        start = time.perf_counter()
+        questions = generate_page(session, page)
+        with file_lock(lock_path(session_id)):
+            session = load(session_id)
+            # Pages generated meanwhile (other page locks) may already hold some of these questions
+            seen = {stem_key(text) for text in asked_questions(session)}
+            fresh = [question for question in questions if stem_key(question["question"]) not in seen]
+            if len(fresh) < len(questions):
+                tracer.increment("quiz_duplicate_questions_total", "stage", "store", len(questions) - len(fresh))
+            questions = fresh
+            if not questions:
+                raise RuntimeError(f"No questions could be generated for page {page}")
+            missing = len(page_slots(session, page)) - len(questions)
+            # A short page is served but not stored, so its next request generates it again
+            if not missing:
+                session["pages"][str(page)] = questions
+                save(session)
+    tracer.increment("quiz_pages_total", "source", "short" if missing else "generated")
+    log(f"Generated page {page} of session {session_id} ({len(questions)} questions, {missing} missing) "
+        f"in {time.perf_counter() - start:.2f}s")
+    return questions
+
+
+def prefetch_pages(session, page):
+    """Generate the pages after `page` in the background, so they are ready when the student gets there."""
+    for ahead in range(page + 1, min(page + 1 + LOOKAHEAD_PAGES, page_count(session))):
+        if str(ahead) in session["pages"]:
+            continue
+        context = contextvars.copy_context()
+        threading.Thread(
+            target=context.run, args=(_lookahead, session["id"], ahead),
+            name=f"quiz-lookahead-{session['id'][:8]}-{ahead}", daemon=True,
+        ).start()
+
+
+def _lookahead(session_id, page):
+    # The student's next page: served at their priority
+    set_request_context(priority="interactive")
+    try:
+        get_page(session_id, page)
+        tracer.increment("quiz_lookahead_total", "result", "ok")
+    except Exception as e:
+        tracer.increment("quiz_lookahead_total", "result", type(e).__name__)
+        log(f"Lookahead of page {page} of session {session_id} failed: {e}")
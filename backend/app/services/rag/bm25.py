@@ -0,0 +1,111 @@
+import math
+import os
+import re
+import numpy as np
+
+
+# Constants
+BM25_FILE = "bm25.npz"
+K1 = 1.2
+B = 0.75
+# Keeps hyphenated and alphanumeric technical terms ("d-block", "3d", "sp3") intact
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a about above after again all also an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from
+further had has have having he her here hers him his how i if in into is it its itself
+just more most my no nor not now of off on once only or other our out over own same she
+should so some such than that the their them then there these they this those through
+to too under until up very was we were what when where which while who whom why will
+with would you your
+""".split())
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the chunks of one index generation, stored as flat NumPy arrays:
+    a sorted vocabulary with offsets into concatenated posting lists (chunk ids and
+    term frequencies), plus every chunk's length. Chunk ids match the FAISS ids.
+    """
+
+    def __init__(self, terms, offsets, doc_ids, term_freqs, doc_lengths):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        self._lookup = {term: i for i, term in enumerate(terms.tolist())}
+
+    @classmethod
+    def build(cls, chunks):
+        postings = {}
+        doc_lengths = np.zeros(len(chunks), dtype=np.int32)
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            doc_lengths[chunk_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                postings.setdefault(token, []).append((chunk_id, count))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        term_freqs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            ids, freqs = zip(*postings[term])
+            doc_ids[offsets[i]:offsets[i + 1]] = ids
+            term_freqs[offsets[i]:offsets[i + 1]] = np.minimum(freqs, np.iinfo(np.uint16).max)
+        return cls(np.array(terms, dtype=str), offsets, doc_ids, term_freqs, doc_lengths)
+
+    def save(self, directory):
+        with open(os.path.join(directory, BM25_FILE), "wb") as f:
+            np.savez(
+                f,
+                terms=self.terms,
+                offsets=self.offsets,
+                doc_ids=self.doc_ids,
+                term_freqs=self.term_freqs,
+                doc_lengths=self.doc_lengths,
+            )
+
+    @classmethod
+    def load(cls, directory):
+        """Load the generation's BM25 index, or None for generations built without one."""
+        path = os.path.join(directory, BM25_FILE)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return cls(data["terms"], data["offsets"], data["doc_ids"], data["term_freqs"], data["doc_lengths"])
+
+    def search(self, query, k):
+        """Top `k` (chunk_id, score) pairs for the query, best first; chunks without a match are left out."""
+        n_docs = len(self.doc_lengths)
+        if not n_docs or k <= 0:
+            return []
+        scores = np.zeros(n_docs, dtype=np.float32)
+        norm = K1 * (1 - B + B * self.doc_lengths / (self.avg_length or 1.0))
+        for token in set(tokenize(query)):
+            i = self._lookup.get(token)
+            if i is None:
+                continue
+            start, end = self.offsets[i], self.offsets[i + 1]
+            ids = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            scores[ids] += idf * tf * (K1 + 1) / (tf + norm[ids])
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(chunk_id), float(scores[chunk_id])) for chunk_id in matched]
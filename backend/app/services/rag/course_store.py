@@ -0,0 +1,168 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from app.services.metrics import tracer
+from app.services.rag import vector_store
+
+
+# Layout: one vector_store root (CURRENT, .lock, gen-*/) per document of a course
+#   courses/<course_id>/<document_id>/
+_BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+COURSES_PATH = os.getenv("COURSES_PATH", os.path.join(_BASE_DIR, "courses"))
+# Loaded shards are unloaded least recently used first once their estimated size exceeds this
+SHARD_MEMORY_BUDGET_MB = int(os.getenv("SHARD_MEMORY_BUDGET_MB", "1024"))
+ID_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+UNSAFE_ID_CHARS_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def valid_id(value):
+    """Course and document ids become directory names, so only a safe subset is allowed."""
+    return bool(value) and ID_RE.match(value) is not None
+
+
+def document_id_from_filename(filename):
+    stem = os.path.splitext(os.path.basename(filename or ""))[0]
+    document_id = UNSAFE_ID_CHARS_RE.sub("-", stem).strip("-._")[:128]
+    return document_id or "document"
+
+
+def shard_root(course_id, document_id):
+    return os.path.join(COURSES_PATH, course_id, document_id)
+
+
+def save_document(course_id, document_id, index, chunks, embeddings=None):
+    """Publish a new generation of one document's shard; returns the generation."""
+    generation = vector_store.save(index, chunks, embeddings, root=shard_root(course_id, document_id))
+    # The replaced generation is not served anymore: free it now rather than on the next search
+    shards.unload(course_id, document_id)
+    return generation
+
+
+def list_documents(course_id):
+    """Ids of the course's documents that have a published shard."""
+    course_path = os.path.join(COURSES_PATH, course_id)
+    if not os.path.isdir(course_path):
+        return []
+    return sorted(
+        name for name in os.listdir(course_path)
+        if os.path.exists(os.path.join(course_path, name, vector_store.CURRENT_FILE))
+    )
+
+
+def corpus_version(course_id, documents):
+    """Stable key for the current content of the given documents of a course."""
+    versions = [
+        f"{document_id}@{vector_store.current_generation(shard_root(course_id, document_id))}"
+        for document_id in sorted(documents)
+    ]
+    return f"course:{course_id}:{','.join(versions)}"
+
+
+# ----------------------------
+# Loaded shards
+# ----------------------------
+class Shard:
+    def __init__(self, course_id, document_id, generation, index, metadata):
+        self.course_id = course_id
+        self.document_id = document_id
+        self.generation = generation
+        self.index = index
+        self.metadata = metadata
+        self.nbytes = shard_nbytes(index, metadata)
+
+
+def shard_nbytes(index, metadata):
+    """
+    Rough resident size of a loaded shard: the flat float32 index, the chunk texts and the
+    BM25 arrays. The float16 embeddings are memory-mapped (page cache) and not counted.
+    """
+    size = index.ntotal * index.d * 4
+    size += sum(len(chunk) for chunk in metadata.get("chunks", []))
+    bm25 = metadata.get("bm25")
+    if bm25 is not None:
+        size += sum(array.nbytes for array in (
+            bm25.terms, bm25.offsets, bm25.doc_ids, bm25.term_freqs, bm25.doc_lengths))
+    return size
+
+
+class ShardCache:
+    """
+    Per-worker LRU of loaded shards under a memory budget. Shards are loaded on first use
+    and reloaded when their document publishes a new generation; the least recently used
+    ones are unloaded when the budget is exceeded (the most recent one always stays), and a
+    shard is unloaded as soon as this worker publishes a new generation of its document.
+    """
+
+    def __init__(self, budget_bytes):
+        self.budget_bytes = budget_bytes
+        self._shards = OrderedDict()  # (course_id, document_id) -> Shard
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        # key -> lock serializing its loads; dropped with the shard, so only loaded and loading shards have one
+        self._load_locks = {}
+
+    def get(self, course_id, document_id):
+        key = (course_id, document_id)
+        root = shard_root(course_id, document_id)
+        generation = vector_store.current_generation(root)
+        with self._lock:
+            shard = self._shards.get(key)
+            if shard is not None and shard.generation == generation:
+                self._shards.move_to_end(key)
+                return shard
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # Loaded outside the cache lock so that shards of a fan-out load in parallel
+        with load_lock:
+            with self._lock:
+                shard = self._shards.get(key)
+                if shard is not None and shard.generation == generation:
+                    self._shards.move_to_end(key)
+                    return shard
+            try:
+                loaded_generation, index, metadata = vector_store.load(root=root)
+            except Exception:
+                with self._lock:
+                    if key not in self._shards:
+                        self._load_locks.pop(key, None)
+                raise
+            shard = Shard(course_id, document_id, loaded_generation, index, metadata)
+            tracer.increment("course_shard_events_total", "event", "load")
+            self._insert(key, shard)
+        log(f"Loaded shard {course_id}/{document_id} ({loaded_generation}, {shard.nbytes / 2**20:.1f} MB)")
+        return shard
+
+    def _insert(self, key, shard):
+        with self._lock:
+            previous = self._shards.pop(key, None)
+            if previous is not None:
+                self._nbytes -= previous.nbytes
+            self._shards[key] = shard
+            self._nbytes += shard.nbytes
+            while self._nbytes > self.budget_bytes and len(self._shards) > 1:
+                evicted_key, evicted = self._shards.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+                self._load_locks.pop(evicted_key, None)
+                tracer.increment("course_shard_events_total", "event", "evict")
+                log(f"Unloaded shard {evicted.course_id}/{evicted.document_id} (memory budget)")
+
+    def unload(self, course_id, document_id=None):
+        """Drop one loaded shard, or every loaded shard of the course."""
+        with self._lock:
+            for key in [key for key in self._shards if key[0] == course_id and document_id in (None, key[1])]:
+                self._nbytes -= self._shards.pop(key).nbytes
+                self._load_locks.pop(key, None)
+                tracer.increment("course_shard_events_total", "event", "unload")
+
+    def loaded(self):
+        with self._lock:
+            return list(self._shards), self._nbytes
+
+
+shards = ShardCache(SHARD_MEMORY_BUDGET_MB * 2**20)
@@ -1,9 +1,9 @@
-import pickle
-import faiss
 import os
 import re
-from transformers import AutoTokenizer
-from sentence_transformers import SentenceTransformer
+from app.services.metrics import tracer
+from app.services.models import embeddings as embedding_service
+from app.services.models import loader
+from app.services.rag import course_store, vector_store
 
 
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
@@ -13,161 +13,174 @@ EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 # CONFIGURATION (resolve to stable paths relative to this file)
 _BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 OCR_FILE_PATH = os.path.join(_BASE_DIR, "..", "mcq_generation", "OCR_text.txt")  # Input OCR text file
-DB_FAISS_PATH = os.path.join(_BASE_DIR, "vector_store")  # Output folder for FAISS index and metadata
+DB_FAISS_PATH = vector_store.DB_FAISS_PATH  # Output folder for FAISS index generations
 MAX_TOKENS = 240  # safe buffer under 256 for all-MiniLM-L6-v2
 OVERLAP_SENTENCES = 1  # number of sentences to overlap between chunks
 SENTENCE_SPLIT_REGEX = r'(?<=[.!?])\s+'
-
-
-def split_into_sentences(text: str):
-    # Normalize whitespace/newlines first (do not lose sentence punctuation)
-    text = text.replace("\r", " ").replace("\n", " ")
-    # Basic sentence split. For very noisy OCR you may want a more robust splitter.
-    raw_sentences = re.split(SENTENCE_SPLIT_REGEX, text)
-    # Strip and remove empty items
-    sentences = [s.strip() for s in raw_sentences if s and s.strip()]
-    return sentences
-
-
-def sentence_token_chunk(
-    text: str,
+MAX_SENTENCE_CHARS = 20000  # an "open sentence" longer than this is cut (no punctuation in OCR noise)
+NON_ASCII_RE = re.compile(r"[^\x00-\x7F]+")
+HYPHEN_END_RE = re.compile(r"\w-$")
+WORD_START_RE = re.compile(r"\w")
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+# ----------------------------
+# Streaming text pipeline: lines -> normalized pieces -> sentences -> chunks.
+# Every stage is a generator that only holds the state needed across a boundary
+# (the previous line, the open sentence, the current chunk window), so memory does
+# not grow with the size of the document.
+# ----------------------------
+def iter_lines(text: str):
+    """Lines of an in-memory text without building a list of all of them."""
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start)
+        if end == -1:
+            yield text[start:]
+            return
+        yield text[start:end]
+        start = end + 1
+
+
+def normalize_lines(lines):
+    """
+    Basic OCR cleaning, one line at a time: non-ASCII characters become spaces, a word
+    hyphenated across a line break is merged ("exam-" + "ple" -> "example"), soft line
+    wraps become spaces and runs of whitespace collapse to one space. Yields text pieces
+    whose concatenation is the cleaned document.
+    """
+    previous = None
+    for line in lines:
+        line = NON_ASCII_RE.sub(" ", line)
+        if previous is not None:
+            if HYPHEN_END_RE.search(previous) and WORD_START_RE.match(line):
+                # Merge across the break: hold the joined text back as the new previous line
+                line = previous[:-1] + line
+            else:
+                yield previous + " "
+        previous = line
+    if previous is not None:
+        yield previous
+
+
+def iter_sentences(pieces, max_chars: int = MAX_SENTENCE_CHARS):
+    """
+    Split a stream of text pieces into sentences. Only the new piece is scanned each time;
+    the open (unterminated) sentence is carried as a list of parts, and one that grows
+    past max_chars is emitted as is.
+    """
+    open_parts = []
+    open_len = 0
+    last_char = ""  # last character seen, to find boundaries and whitespace runs across pieces
+    for piece in pieces:
+        piece = WHITESPACE_RE.sub(" ", piece)
+        if last_char == " " and piece.startswith(" "):
+            piece = piece[1:]
+        if not piece:
+            continue
+        parts = re.split(SENTENCE_SPLIT_REGEX, last_char + piece)
+        parts[0] = parts[0][len(last_char):]
+        last_char = piece[-1]
+        if len(parts) == 1:
+            open_parts.append(parts[0])
+            open_len += len(parts[0])
+            if open_len > max_chars:
+                sentence = "".join(open_parts).strip()
+                if sentence:
+                    yield sentence
+                open_parts, open_len = [], 0
+            continue
+        open_parts.append(parts[0])
+        for sentence in ["".join(open_parts)] + parts[1:-1]:
+            sentence = sentence.strip()
+            if sentence:
+                yield sentence
+        open_parts, open_len = [parts[-1]], len(parts[-1])
+    sentence = "".join(open_parts).strip()
+    if sentence:
+        yield sentence
+
+
+def iter_chunks(
+    sentences,
     model_name: str = EMBED_MODEL_NAME,
     max_tokens: int = MAX_TOKENS,
     overlap_sentences: int = OVERLAP_SENTENCES,
 ):
     """
-    Returns list of chunk texts. Each chunk's token length (according to model_name tokenizer)
-    will be <= max_tokens (except pathological cases handled by internal splitting).
+    Greedily pack sentences into chunks of at most max_tokens tokens (according to the
+    model_name tokenizer), repeating the last overlap_sentences sentences of a chunk at
+    the start of the next one. A sentence longer than max_tokens is split into token slices.
     """
-    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
-    sentences = split_into_sentences(text)
-    if not sentences:
-        return []
-
-    # Pre-tokenize all sentences to ids once (fast enough for typical docs)
-    sent_token_ids = [tokenizer.encode(
-        s, add_special_tokens=False) for s in sentences]
-    # lengths of sentences in tokens for each sentence is stored here.
-    sent_token_lens = [len(ids) for ids in sent_token_ids]
-
-    chunks = []
-    n = len(sentences)
-    i = 0
-
-    while i < n:
-        # Build a chunk starting at sentence i
-        curr_sent_indices = []
-        curr_len = 0
-        j = i
-
-        # Greedily add sentences until next would exceed max_tokens
-        while (j < n) and (curr_len + sent_token_lens[j] <= max_tokens):
-            curr_sent_indices.append(j)
-            curr_len += sent_token_lens[j]
-            j += 1
-
-        if j == i:
-            # Single sentence too long (> max_tokens). Split it into token slices.
-            long_ids = sent_token_ids[i]
-            start_idx = 0
-            while start_idx < len(long_ids):
-                slice_ids = long_ids[start_idx: start_idx + max_tokens]
-                slice_text = tokenizer.decode(
-                    slice_ids, clean_up_tokenization_spaces=True).strip()
-                if slice_text:
-                    chunks.append(slice_text)
-                start_idx += max_tokens  # no overlap inside huge sentence
-            # Move to next sentence (we consumed sentence i completely)
-            i += 1
-            # For overlap semantics: the next chunk will start from max(i+1, previous j-overlap) in normal flow
-            continue
-
-        # Compose chunk text from sentences i .. j-1
-        chunk_text = " ".join(sentences[idx]
-                              for idx in curr_sent_indices).strip()
-        chunks.append(chunk_text)
-
-        # Determine next start index with sentence-overlap
-        if overlap_sentences <= 0:
-            i = j
-        else:
-            # Attempt to back up overlap_sentences into the last chunk
-            next_start = j - overlap_sentences
-            # Ensure progress (at least advance by 1)
-            if next_start <= i:  # Only happens when j==i case is executed.
-                next_start = i + 1
-            i = next_start
-
-    return chunks
-
-
-def preprocess_text(text: str) -> str:
+    tokenizer = loader.get_tokenizer(model_name)
+    window = []  # (sentence, token count) of the chunk being built
+    window_len = 0
+
+    for sentence in sentences:
+        ids = tokenizer.encode(sentence, add_special_tokens=False)
+        while True:
+            if not window and len(ids) > max_tokens:
+                # Single sentence too long: split it into token slices (no overlap inside it)
+                for start_idx in range(0, len(ids), max_tokens):
+                    slice_text = tokenizer.decode(
+                        ids[start_idx: start_idx + max_tokens], clean_up_tokenization_spaces=True).strip()
+                    if slice_text:
+                        yield slice_text
+                break
+            if window_len + len(ids) <= max_tokens:
+                window.append((sentence, len(ids)))
+                window_len += len(ids)
+                break
+            yield " ".join(text for text, _ in window).strip()
+            # Back up overlap_sentences into the finished chunk, but always make progress
+            window = window[max(1, len(window) - overlap_sentences):] if overlap_sentences > 0 else []
+            window_len = sum(length for _, length in window)
+
+    if window:
+        yield " ".join(text for text, _ in window).strip()
+
+
+def save_faiss_index(index, embeddings, chunks, course_id=None, document_id=None):
+    # Written as a new generation and published atomically, so workers that are
+    # reading the previous index are never exposed to a half-written one
+    if course_id is not None:
+        return course_store.save_document(course_id, document_id, index, chunks, embeddings)
+    return vector_store.save(index, chunks, embeddings)
+
+
+def main(raw_text=None, course_id=None, document_id=None):
     """
-    Basic OCR cleaning for a fragment: merge hyphen-line-breaks, convert single newlines (soft wraps)
-    to spaces, preserve double newlines as paragraph separators, normalize whitespace.
+    Build the index for the OCR text (or `raw_text`) and publish it as the live index,
+    or with course_id, as the shard of `document_id` in that course's corpus.
     """
-    # Merge hyphenated line breaks: "exam-\nple" -> "example"
-    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
-    # Preserve paragraph breaks: temporarily marker
-    text = re.sub(r"\n\s*\n", "<PARAGRAPH1234>", text)
-    # Replace remaining single newlines with spaces (soft wraps)
-    text = re.sub(r"\n", " ", text)
-    # Restore paragraph marker to double newline
-    text = text.replace("<PARAGRAPH1234>", "\n\n")
-    # Normalize multiple spaces
-    text = re.sub(r"\s+", " ", text)
-
-    return text.strip()
-
-
-def preprocess_text(text: str) -> str:
-    """Basic text cleaning for OCR output."""
-    text = re.sub(r'[^\x00-\x7F]+', ' ', text)  # remove non-ASCII chars
-    # Merge hyphenated line breaks: "exam-\nple" -> "example"
-    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
-    # Replace remaining single newlines with spaces (soft wraps)
-    text = re.sub(r"\n", " ", text)
-    # Normalize multiple spaces
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
-
-
-def save_faiss_index(index, embeddings, chunks):
-    os.makedirs(DB_FAISS_PATH, exist_ok=True)
-    faiss.write_index(index, os.path.join(DB_FAISS_PATH, "index.faiss"))
-    with open(os.path.join(DB_FAISS_PATH, "metadata.pkl"), "wb") as f:
-        pickle.dump({"chunks": chunks}, f)
-
-
-def main():
     print("Starting the database generation process...")
-    # Step 1: Read OCR text
-    with open(OCR_FILE_PATH, "r", encoding="utf-8") as f:
-        raw_text = f.read()
-    print("Finished Reading file")
-
-    # Step 2: Preprocess text
-    cleaned_text = preprocess_text(raw_text)
-    print("Finished Preprocessing the text")
-
-    # Step 3: Hybrid chunking
-    chunks = sentence_token_chunk(cleaned_text)
-    print(f"Created {len(chunks)} chunks...")
+    with tracer.span("chunk"):
+        # Steps 1-3: read, clean and chunk the OCR text as a stream (callers that already
+        # have it in memory pass it in; otherwise the file is read line by line)
+        if raw_text is None:
+            with open(OCR_FILE_PATH, "r", encoding="utf-8") as f:
+                chunks = list(iter_chunks(iter_sentences(normalize_lines(line.rstrip("\n") for line in f))))
+        else:
+            chunks = list(iter_chunks(iter_sentences(normalize_lines(iter_lines(raw_text)))))
+        print(f"Created {len(chunks)} chunks...")
 
     # Step 4: Create embeddings
-    model = SentenceTransformer(EMBED_MODEL_NAME)
-    embeddings = model.encode(chunks, show_progress_bar=True)
+    with tracer.span("embed"):
+        embeddings = embedding_service.encode(chunks)
     print("Created embeddings, now creating FAISS index...")
 
-    # Step 5: Build FAISS index
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(embeddings)
-    print("FAISS index created, now storing them in a database")
-
-    # Step 6: Save index & metadata
-    save_faiss_index(index, embeddings, chunks)
-    print(f"Vector database saved to '{DB_FAISS_PATH}' with {len(chunks)} chunks.")
+    with tracer.span("index_build"):
+        # Step 5: Build FAISS index
+        dim = embeddings.shape[1]
+        index = loader.get_faiss().IndexFlatL2(dim)
+        index.add(embeddings)
+        print("FAISS index created, now storing them in a database")
+
+        # Step 6: Save index & metadata
+        generation = save_faiss_index(index, embeddings, chunks, course_id, document_id)
+    target = DB_FAISS_PATH if course_id is None else course_store.shard_root(course_id, document_id)
+    print(f"Vector database saved to '{target}' as {generation} with {len(chunks)} chunks.")
+    return generation
 
 
 if __name__ == "__main__":
@@ -0,0 +1,129 @@
+import json
+import os
+import numpy as np
+from app.services.models import embeddings
+from app.services.rag import vector_store
+from app.services.rag.bm25 import tokenize
+from app.services.storage.file_store import atomic_write_json
+
+
+# Constants
+# Written next to the index of a generation once topic extraction has finished:
+#   {"<normalized topic>": {"topic": label, "chunks": [[chunk_id, cosine], ...] best first}}
+# (chunks the topic was extracted from first, then the ones assigned by similarity)
+TOPIC_MAP_FILE = "topic_chunks.json"
+# A chunk belongs to a topic-extraction chunk when this share of its terms occurs in it
+MIN_CONTAINMENT = 0.6
+# Chunks no extracted topic came from join their most similar topic above this cosine
+MIN_SIMILARITY = 0.35
+# Chunks are in document order, so only the next few topic-extraction chunks are compared
+SOURCE_WINDOW = 3
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def topic_key(topic):
+    return str(topic).strip().lower()
+
+
+def link_chunks(chunks, source_chunks):
+    """
+    Index chunk ids contained in each topic-extraction chunk. Both chunkings cover the
+    same text in order, so a pointer walks the source chunks alongside the index chunks;
+    a chunk that straddles a boundary is linked to both sides.
+    """
+    source_terms = [set(tokenize(source)) for source in source_chunks]
+    linked = [[] for _ in source_chunks]
+    position = 0
+    for chunk_id, chunk in enumerate(chunks):
+        terms = set(tokenize(chunk))
+        if not terms:
+            continue
+        matches = [
+            i for i in range(position, min(position + SOURCE_WINDOW, len(source_terms)))
+            if len(terms & source_terms[i]) / len(terms) >= MIN_CONTAINMENT
+        ]
+        for i in matches:
+            linked[i].append(chunk_id)
+        if matches:
+            position = matches[-1]
+    return linked
+
+
+def build_topic_map(chunks, chunk_vectors, topics, sources=None, source_chunks=None):
+    """
+    Posting list of index chunk ids per extracted topic: the chunks of the text the topic
+    was extracted from (`sources`: topic -> topic-extraction chunk indices), then every
+    remaining chunk is assigned to its most similar topic by embedding. Each group is
+    ordered by cosine similarity between the topic and the chunk.
+    """
+    if not topics or not len(chunks):
+        return {}
+    topic_vectors = embeddings.encode(topics, normalize=True)
+    vectors = np.asarray(chunk_vectors, dtype=np.float32)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    similarity = vectors @ np.asarray(topic_vectors, dtype=np.float32).T  # chunks x topics
+
+    linked = link_chunks(chunks, source_chunks) if sources and source_chunks else []
+    extracted = [set() for _ in topics]
+    for t, topic in enumerate(topics):
+        for i in (sources or {}).get(topic, []):
+            if i < len(linked):
+                extracted[t].update(linked[i])
+    assigned = set().union(*extracted)
+    similar = [set() for _ in topics]
+    best = similarity.argmax(axis=1)
+    for chunk_id in range(len(chunks)):
+        if chunk_id not in assigned and similarity[chunk_id, best[chunk_id]] >= MIN_SIMILARITY:
+            similar[best[chunk_id]].add(chunk_id)
+
+    topic_map = {}
+    for t, topic in enumerate(topics):
+        ranked = [
+            chunk_id
+            for group in (extracted[t], similar[t])
+            for chunk_id in sorted(group, key=lambda chunk_id: -similarity[chunk_id, t])
+        ]
+        topic_map[topic_key(topic)] = {
+            "topic": topic,
+            "chunks": [[int(chunk_id), round(float(similarity[chunk_id, t]), 4)] for chunk_id in ranked],
+        }
+    return topic_map
+
+
+def save(generation, topic_map, root=vector_store.DB_FAISS_PATH):
+    """Attach the topic map to a published generation (skipped if it has been pruned since)."""
+    path = vector_store.generation_path(generation, root)
+    # The shared lock keeps the generation from being pruned while the file is written
+    with vector_store.read_lock(root):
+        if not os.path.isdir(path):
+            return False
+        atomic_write_json(os.path.join(path, TOPIC_MAP_FILE), topic_map)
+    return True
+
+
+def load(generation, root=vector_store.DB_FAISS_PATH):
+    """The generation's topic map, or None if none has been written (yet)."""
+    try:
+        with open(os.path.join(vector_store.generation_path(generation, root), TOPIC_MAP_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def index_topics(generation, topics, sources=None, source_chunks=None, root=vector_store.DB_FAISS_PATH):
+    """Build and attach the topic map of a freshly built generation for its extracted topics."""
+    if generation is None or not topics:
+        return None
+    _, _, metadata = vector_store.load(generation, root)
+    stored = metadata.get("embeddings")
+    if stored is None:
+        return None
+    topic_map = build_topic_map(metadata["chunks"], stored, topics, sources, source_chunks)
+    save(generation, topic_map, root)
+    direct = sum(1 for entry in topic_map.values() if entry["chunks"])
+    log(f"Topic map for {generation}: {direct}/{len(topics)} topics with chunk postings")
+    return topic_map
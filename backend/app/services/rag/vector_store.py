@@ -0,0 +1,115 @@
+import os
+import pickle
+import shutil
+import time
+import numpy as np
+from contextlib import contextmanager
+from app.services.models import loader
+from app.services.rag.bm25 import BM25Index
+from app.services.storage.file_store import atomic_write, file_lock
+
+
+# Layout (the same under every root; course shards use their own roots, see course_store):
+#   vector_store/CURRENT           name of the live generation (replaced atomically)
+#   vector_store/.lock             reader/writer lock shared by all workers
+#   vector_store/gen-<ns>-<pid>/   one published index generation
+_BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_FAISS_PATH = os.path.join(_BASE_DIR, "vector_store")
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+INDEX_FILE = "index.faiss"
+METADATA_FILE = "metadata.pkl"
+EMBEDDINGS_FILE = "embeddings.npy"  # float16 copy of the chunk vectors, memory-mapped by readers
+GENERATION_PREFIX = "gen-"
+KEEP_GENERATIONS = 2  # the live one plus the previous one
+
+
+def current_generation(root=DB_FAISS_PATH):
+    """Name of the live generation, or None for the legacy single-directory layout."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def generation_path(generation, root=DB_FAISS_PATH):
+    return os.path.join(root, generation) if generation else root
+
+
+@contextmanager
+def read_lock(root=DB_FAISS_PATH):
+    with file_lock(os.path.join(root, LOCK_FILE), shared=True):
+        yield
+
+
+# ----------------------------
+# Writing
+# ----------------------------
+def create_staging_dir(root=DB_FAISS_PATH):
+    """Private directory to write a new generation into before it is published."""
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f".staging-{time.time_ns()}-{os.getpid()}")
+    os.makedirs(path)
+    return path
+
+
+def publish(staging_dir, root=DB_FAISS_PATH):
+    """Turn a fully written staging directory into the live generation."""
+    generation = f"{GENERATION_PREFIX}{time.time_ns()}-{os.getpid()}"
+    with file_lock(os.path.join(root, LOCK_FILE)):
+        os.rename(staging_dir, generation_path(generation, root))
+        atomic_write(os.path.join(root, CURRENT_FILE), generation)
+        _prune(generation, root)
+    return generation
+
+
+def _prune(live_generation, root):
+    # Called with the exclusive lock held, so no reader is inside an old generation
+    generations = sorted(
+        name for name in os.listdir(root)
+        if name.startswith(GENERATION_PREFIX) and name != live_generation
+    )
+    for name in generations[:max(0, len(generations) - (KEEP_GENERATIONS - 1))]:
+        shutil.rmtree(generation_path(name, root), ignore_errors=True)
+
+
+def save(index, chunks, embeddings=None, root=DB_FAISS_PATH):
+    """
+    Write the index, its chunk metadata, a BM25 index over the same chunk ids and (if
+    given) the chunk embeddings as float16 as a new generation under `root` and publish it.
+    """
+    staging_dir = create_staging_dir(root)
+    try:
+        loader.get_faiss().write_index(index, os.path.join(staging_dir, INDEX_FILE))
+        with open(os.path.join(staging_dir, METADATA_FILE), "wb") as f:
+            pickle.dump({"chunks": chunks}, f)
+        BM25Index.build(chunks).save(staging_dir)
+        if embeddings is not None:
+            np.save(os.path.join(staging_dir, EMBEDDINGS_FILE), np.asarray(embeddings, dtype=np.float16))
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+    return publish(staging_dir, root)
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def load(generation=None, root=DB_FAISS_PATH):
+    """
+    Load (generation, index, metadata) for the live generation under `root` under a shared lock.
+    metadata["bm25"] is the generation's BM25Index and metadata["embeddings"] its memory-mapped
+    float16 chunk vectors; either is None for generations built without them.
+    """
+    with read_lock(root):
+        if generation is None:
+            generation = current_generation(root)
+        path = generation_path(generation, root)
+        index = loader.get_faiss().read_index(os.path.join(path, INDEX_FILE))
+        with open(os.path.join(path, METADATA_FILE), "rb") as f:
+            metadata = pickle.load(f)
+        metadata["bm25"] = BM25Index.load(path)
+        embeddings_path = os.path.join(path, EMBEDDINGS_FILE)
+        metadata["embeddings"] = np.load(embeddings_path, mmap_mode="r") if os.path.exists(embeddings_path) else None
+    return generation, index, metadata
@@ -0,0 +1 @@
+# Shared on-disk state helpers
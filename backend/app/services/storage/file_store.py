@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev mode only, locks become no-ops
+    fcntl = None
+
+
+# ----------------------------
+# Atomic writes
+# ----------------------------
+def atomic_write(path, data):
+    """
+    Write str or bytes to `path` so that readers only ever see the old or the new
+    content: write to a temp file in the same directory, fsync, then os.replace.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    binary = isinstance(data, (bytes, bytearray, memoryview))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb" if binary else "w", **({} if binary else {"encoding": "utf-8"})) as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, obj, **dump_kwargs):
+    atomic_write(path, json.dumps(obj, **dump_kwargs))
+
+
+# ----------------------------
+# Cross-process locks
+# ----------------------------
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Reader/writer lock shared by every worker process, backed by flock on `path`.
+    shared=True lets several readers in at once; shared=False is exclusive.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
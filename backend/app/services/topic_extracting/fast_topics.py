@@ -0,0 +1,127 @@
+import os
+import re
+from collections import Counter, defaultdict
+import numpy as np
+from app.services.metrics import tracer
+from app.services.models import embeddings, loader
+
+
+# Constants
+TOP_K = 10
+CHUNK_WORDS = 200  # smaller than the LLM chunks: spaCy cost grows with doc length
+BATCH_SIZE = 32
+# Worker processes for nlp.pipe; only worth starting for long documents
+N_PROCESS = int(os.getenv("FAST_TOPICS_PROCESSES", str(min(4, os.cpu_count() or 1))))
+MIN_CHUNKS_PER_PROCESS = 16
+SHORTLIST = 50  # candidates re-scored with embeddings
+CENTRALITY_WEIGHT = 0.5  # share of the score from similarity to the document embedding
+# Chunks embedded for the document embedding, evenly spread over long documents
+DOCUMENT_SAMPLE_CHUNKS = 64
+DUPLICATE_SIMILARITY = 0.85
+MAX_WORDS = 3
+MAX_CHARS = 20
+# The parser gives noun chunks; nothing else downstream needs the rest of the pipeline
+DISABLED_PIPES = ["ner"]
+SKIP_POS = {"DET", "PRON", "NUM", "PUNCT", "SYM", "CCONJ", "ADP"}
+
+
+def split_into_chunks(text, max_words=CHUNK_WORDS):
+    words = text.split()
+    return [" ".join(words[i: i + max_words]) for i in range(0, len(words), max_words)]
+
+
+def candidate_phrases(doc):
+    """
+    Noun phrases of a parsed chunk as (key, surface) pairs: leading determiners,
+    pronouns and numbers are dropped and the key is the lower-cased lemma form.
+    """
+    for span in doc.noun_chunks:
+        tokens = [token for token in span if not token.is_space]
+        while tokens and (tokens[0].pos_ in SKIP_POS or tokens[0].is_stop):
+            tokens = tokens[1:]
+        if not tokens or len(tokens) > MAX_WORDS or all(token.is_stop for token in tokens):
+            continue
+        surface = " ".join(token.text for token in tokens)
+        if len(surface) > MAX_CHARS or len(surface) < 4 or not re.fullmatch(r"[A-Za-z][A-Za-z0-9 -]*", surface):
+            continue
+        key = " ".join(token.lemma_.lower() for token in tokens)
+        yield key, surface
+
+
+def parse_chunks(chunks):
+    """Run spaCy over the chunks in batches, in several processes for long documents."""
+    nlp = loader.get_spacy()
+    n_process = N_PROCESS if len(chunks) >= N_PROCESS * MIN_CHUNKS_PER_PROCESS else 1
+    per_chunk = []
+    surfaces = defaultdict(Counter)
+    with nlp.select_pipes(disable=[pipe for pipe in DISABLED_PIPES if pipe in nlp.pipe_names]):
+        for doc in nlp.pipe(chunks, batch_size=BATCH_SIZE, n_process=n_process):
+            keys = []
+            for key, surface in candidate_phrases(doc):
+                keys.append(key)
+                surfaces[key][surface] += 1
+            per_chunk.append(keys)
+    return per_chunk, surfaces
+
+
+def tfidf_scores(per_chunk):
+    """TF-IDF of every candidate, treating each chunk as a document, summed over chunks."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(analyzer=lambda keys: keys, sublinear_tf=True)
+    matrix = vectorizer.fit_transform(per_chunk)
+    scores = np.asarray(matrix.sum(axis=0)).ravel()
+    return dict(zip(vectorizer.get_feature_names_out(), scores))
+
+
+def document_embedding(chunks):
+    """Normalized mean of the chunk embeddings, from an even sample of a long document's chunks."""
+    step = max(1, len(chunks) // DOCUMENT_SAMPLE_CHUNKS)
+    vectors = embeddings.encode(chunks[::step][:DOCUMENT_SAMPLE_CHUNKS], normalize=True)
+    document = vectors.mean(axis=0)
+    return document / (np.linalg.norm(document) or 1.0)
+
+
+def rank_by_centrality(shortlist, tfidf, labels, document, top_k):
+    """
+    Blend TF-IDF with cosine similarity to the document embedding and skip
+    near-duplicates of already picked topics.
+    """
+    vectors = embeddings.encode([labels[key] for key in shortlist], normalize=True)
+    weights = np.array([tfidf[key] for key in shortlist], dtype="float32")
+    centrality = vectors @ document
+    scores = (1 - CENTRALITY_WEIGHT) * weights / weights.max() + CENTRALITY_WEIGHT * centrality
+
+    selected = []
+    for i in np.argsort(-scores):
+        if any(float(vectors[i] @ vectors[j]) > DUPLICATE_SIMILARITY for j in selected):
+            continue
+        selected.append(i)
+        if len(selected) == top_k:
+            break
+    return [labels[shortlist[i]] for i in selected]
+
+
+def extract_topics_fast(text, top_k=TOP_K):
+    """
+    LLM-free topic extraction: spaCy noun phrases scored by TF-IDF across chunks and by
+    MiniLM centrality against the whole document. Same result shape as the LLM mode.
+    """
+    with tracer.span("chunk"):
+        chunks = split_into_chunks(text)
+    if not chunks:
+        return {"topics": []}
+
+    with tracer.span("topic_candidates"):
+        per_chunk, surfaces = parse_chunks(chunks)
+        if not any(per_chunk):
+            return {"topics": []}
+        tfidf = tfidf_scores(per_chunk)
+        shortlist = sorted(tfidf, key=tfidf.get, reverse=True)[:SHORTLIST]
+        # Show each phrase the way it is most often written in the document
+        labels = {key: surfaces[key].most_common(1)[0][0] for key in shortlist}
+        labels = {key: label[0].upper() + label[1:] for key, label in labels.items()}
+
+    with tracer.span("topic_ranking"):
+        topics = rank_by_centrality(shortlist, tfidf, labels, document_embedding(chunks), top_k)
+    return {"topics": topics}
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from app.services.metrics import tracer
+
+
+# Constants
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv("TOPIC_CACHE_PATH", os.path.join(_BASE_DIR, "topic_cache.sqlite3"))
+MAX_ENTRIES = int(os.getenv("TOPIC_CACHE_MAX_ENTRIES", "50000"))
+# Eviction runs every EVICT_EVERY writes rather than on each one
+EVICT_EVERY = 100
+BUSY_TIMEOUT = 10.0  # seconds to wait for another worker's write lock
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def chunk_key(chunk, model, prompt_version):
+    """Cache key: the chunk text, the model that read it and the prompt it was asked with."""
+    digest = hashlib.sha256()
+    for part in (prompt_version, model, chunk):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class TopicCache:
+    """
+    Persistent chunk -> topic list cache in SQLite, shared by every worker process.
+    Bounded to `max_entries` rows; the least recently used rows are evicted first.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_topics ("
+                " key TEXT PRIMARY KEY, topics TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chunk_topics_last_used ON chunk_topics (last_used)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Cached topic list for `key`, or None. A hit refreshes the entry's recency."""
+        try:
+            conn = self._connection()
+            row = conn.execute("SELECT topics FROM chunk_topics WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                tracer.increment("topic_cache_lookups_total", "result", "miss")
+                return None
+            conn.execute("UPDATE chunk_topics SET last_used = ? WHERE key = ?", (time.time(), key))
+        except sqlite3.Error as e:
+            log(f"Topic cache read failed: {e}")
+            return None
+        tracer.increment("topic_cache_lookups_total", "result", "hit")
+        return json.loads(row[0])
+
+    def put(self, key, topics):
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO chunk_topics (key, topics, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(topics), time.time()),
+            )
+            with self._lock:
+                self._writes += 1
+                evict = self._writes % EVICT_EVERY == 0
+            if evict:
+                self.evict()
+        except sqlite3.Error as e:
+            log(f"Topic cache write failed: {e}")
+
+    def evict(self):
+        conn = self._connection()
+        deleted = conn.execute(
+            "DELETE FROM chunk_topics WHERE key IN ("
+            " SELECT key FROM chunk_topics ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        if deleted:
+            tracer.increment("topic_cache_evictions_total", "cache", "chunk_topics", deleted)
+            log(f"Evicted {deleted} least recently used topic cache entries")
+
+
+# Shared by every upload in this process
+topic_cache = TopicCache()
@@ -1,12 +1,29 @@
-import spacy
+import contextvars
+import hashlib
+import os
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import fitz  # PyMuPDF
 import re
+import time
 import ollama
 import json
+from pydantic import ValidationError
+from app.services.metrics import tracer
+from app.services.models import loader
+from app.services.ocr import page_ocr
+from app.services.llm import routing
+from app.services.llm.scheduler import LLMOverloaded, scheduler
+from app.schemas.question import MAX_CHUNK_TOPICS, TopicList, topic_list_schema
+from .topic_cache import chunk_key, topic_cache
 
 # Constants
-MODEL_NAME = "llama3.1"
+MODEL_NAME = "llama3.1"  # fallback when the routing policy has no candidate
+# Keep the model loaded so the constant system prompt and instructions stay cached
+KEEP_ALIVE = "30m"
+# Constrain the output to the TopicList JSON schema (Ollama >= 0.5)
+STRUCTURED_OUTPUT = os.getenv("OLLAMA_STRUCTURED_OUTPUT", "1") != "0"
+# Set USE_TOPIC_CACHE=0 to always ask the LLM
+USE_TOPIC_CACHE = os.getenv("USE_TOPIC_CACHE", "1") != "0"
 
 
 def clean_topic_text(topic):
@@ -26,16 +43,37 @@ def clean_topic_text(topic):
 # ----------------------------
 # Query LLM using Ollama
 # ----------------------------
-def query_ollama_chunk(chunk, model=MODEL_NAME):
+def query_ollama_chunk(chunk, model=None):
+    """Ask the LLM for the chunk's topics. Without an explicit model the routing policy picks one."""
     prompt = build_topic_prompt(chunk)
-    response = ollama.chat(
-        model=model,
-        messages=[
-            {"role": "system", "content": "You are an educational content summarizer."},
-            {"role": "user", "content": prompt},
-        ],
-    )
-    return response["message"]["content"]
+    for attempt in range(2):
+        chosen = model or routing.resolve_model("topics", default=MODEL_NAME)
+        start = time.perf_counter()
+        try:
+            with scheduler.slot():
+                response = ollama.chat(
+                    model=chosen,
+                    messages=[
+                        {"role": "system", "content": "You are an educational content summarizer."},
+                        {"role": "user", "content": prompt},
+                    ],
+                    format=topic_list_schema() if STRUCTURED_OUTPUT else None,
+                    keep_alive=KEEP_ALIVE,
+                )
+        except ollama.ResponseError as e:
+            routing.record_call("topics", None, chosen, time.perf_counter() - start, ok=False)
+            if e.status_code == 404 and model is None and attempt == 0:
+                # Model not pulled: retry once with the next candidate
+                routing.mark_unavailable(chosen)
+                continue
+            raise
+        content = response["message"]["content"]
+        routing.record_call(
+            "topics", None, chosen, time.perf_counter() - start,
+            ok=is_topic_list(content), result=response,
+        )
+        tracer.record_ollama(response)
+        return content
 
 
 # ----------------------------
@@ -54,27 +92,86 @@ Guidelines:
 - Avoid vague terms (e.g., "things", "concepts", "nature").
 - Strictly avoid repetition or chapter headings.
 
-Output format (JSON array of strings):
-[
-  "Topic A",
-  "Topic B"
-  ...
-]
+Output format (JSON object with an array of strings):
+{{
+  "topics": [
+    "Topic A",
+    "Topic B"
+    ...
+  ]
+}}
 
 Text:
 \"\"\"{chunk}\"\"\"
 """
 
 
+# Changes whenever the prompt template or the output mode changes, invalidating cached topics
+PROMPT_VERSION = hashlib.sha256(
+    (build_topic_prompt("") + f"structured={STRUCTURED_OUTPUT}").encode("utf-8")
+).hexdigest()[:16]
+
+
+def is_topic_list(response):
+    try:
+        TopicList.model_validate_json(response)
+        return True
+    except ValidationError:
+        return False
+
+
+def parse_topics(response):
+    """Decode the topic list, tolerating bare arrays and free-form text from older servers."""
+    try:
+        return TopicList.model_validate_json(response).topics
+    except ValidationError:
+        pass
+    try:
+        parsed = json.loads(response)
+    except Exception:
+        parsed = None
+    # A valid {"topics": [...]} that failed validation (e.g. too many topics), or a bare array.
+    # Parsed JSON never goes to the regex, which would return its keys as topics.
+    if isinstance(parsed, dict):
+        parsed = parsed.get("topics")
+        if not isinstance(parsed, list):
+            tracer.increment("llm_parse_failures_total", "call_site", "topics")
+            return []
+    if isinstance(parsed, list):
+        return [topic for topic in parsed if isinstance(topic, str)][:MAX_CHUNK_TOPICS]
+    # Fallback: try to extract with regex if not valid JSON
+    tracer.increment("llm_parse_failures_total", "call_site", "topics")
+    return re.findall(r'"([^"]+)"', response)
+
+
+def chunk_topics(chunk, model=None):
+    """
+    Raw topic list for one chunk, from the topic cache when this chunk has already been
+    read by the same model with the same prompt. Returns (topics, cache_hit).
+    """
+    chosen = model or routing.resolve_model("topics", default=MODEL_NAME)
+    if USE_TOPIC_CACHE:
+        cached = topic_cache.get(chunk_key(chunk, chosen, PROMPT_VERSION))
+        if cached is not None:
+            return cached, True
+
+    response = query_ollama_chunk(chunk, model=model)
+    # Expecting {"topics": [...]}
+    with tracer.span("parse"):
+        topics = parse_topics(response)
+    # Only cache clean answers; a 404 may have moved the call to the next candidate model
+    if USE_TOPIC_CACHE and topics and is_topic_list(response):
+        used = model or routing.resolve_model("topics", default=MODEL_NAME)
+        topic_cache.put(chunk_key(chunk, used, PROMPT_VERSION), topics)
+    return topics, False
+
+
 # ----------------------------
 # Step 1: Extract PDF Text
 # ----------------------------
 def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    full_text = ""
-    for page in doc:
-        full_text += page.get_text()
-    return full_text
+    # Text layer where usable, Tesseract OCR for scanned pages
+    return page_ocr.extract_text(pdf_path)
 
 
 # ----------------------------
@@ -93,46 +190,98 @@ def split_into_chunks(text, max_words=500):
 # ----------------------------
 
 
-def extract_topics_from_pdf_text(text, model=MODEL_NAME, output_json="topics.json"):
-    chunks = split_into_chunks(text)
-    all_topics = set()
+class TopicTally:
+    """
+    Cleaned topics, deduplicated case-insensitively, with the number of chunks that
+    named each one (and which chunks). Topics named by more chunks rank higher.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.labels = {}
+        self.chunks = {}
+
+    def add(self, topics, chunk=None):
+        """Count one chunk's topics; returns the ones not seen in earlier chunks."""
+        new_topics = []
+        seen = set()
+        for topic in topics:
+            cleaned = clean_topic_text(topic)
+            if not cleaned or cleaned.lower() in seen:
+                continue
+            key = cleaned.lower()
+            seen.add(key)
+            if key not in self.labels:
+                self.labels[key] = cleaned
+                new_topics.append(cleaned)
+            self.counts[key] += 1
+            if chunk is not None:
+                self.chunks.setdefault(key, []).append(chunk)
+        return new_topics
+
+    def ranked(self, limit=10):
+        return [self.labels[key] for key, _ in self.counts.most_common(limit)]
+
+    def sources(self, topics):
+        """Indices of the chunks each of the given topics was extracted from."""
+        return {topic: sorted(self.chunks.get(topic.lower(), [])) for topic in topics}
+
+
+def iter_chunk_topics(chunks, model=None):
+    """Yield (chunk_index, raw_topics) for every chunk, in completion order."""
+    cache_hits = []
 
     def process_chunk(i, chunk):
         print(f"[{i+1}/{len(chunks)}] Processing chunk...")
         try:
-            response = query_ollama_chunk(chunk, model=model)
-            # Expecting JSON array of strings
-            topics = []
-            try:
-                topics = json.loads(response)
-            except Exception:
-                # Fallback: try to extract with regex if not valid JSON
-                topics = re.findall(r'"([^"]+)"', response)
-            return topics
+            topics, hit = chunk_topics(chunk, model=model)
+            if hit:
+                cache_hits.append(i)
+            return i, topics
+        except LLMOverloaded:
+            raise
         except Exception as e:
             print(f"❌ Error in chunk {i+1}: {e}")
-            return []
+            return i, []
 
-    # Thread pool
+    # Thread pool (each task runs in a copy of the caller's context to keep the request trace)
     with ThreadPoolExecutor(max_workers=10) as executor:
         futures = [
-            executor.submit(process_chunk, i, chunk) for i, chunk in enumerate(chunks)
+            executor.submit(contextvars.copy_context().run, process_chunk, i, chunk)
+            for i, chunk in enumerate(chunks)
         ]
 
-        for future in as_completed(futures):
-            for topic in future.result():
-                cleaned = clean_topic_text(topic)
-                if cleaned and cleaned.lower() not in (t.lower() for t in all_topics):
-                    all_topics.add(cleaned)
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Shed upload or consumer gone: do not leave the remaining chunks queued for the LLM
+            for future in futures:
+                future.cancel()
+
+    if chunks:
+        print(f"Topic cache: {len(cache_hits)}/{len(chunks)} chunks served from cache "
+              f"({len(cache_hits) / len(chunks):.0%} hit rate)")
+
 
-    selected_topics = list(all_topics)[:10]
-    return {"topics": selected_topics}
+def extract_topics_with_sources(text, model=None, limit=10):
+    """Returns (result, chunks, sources): the topics plus the chunks each one was extracted from."""
+    with tracer.span("chunk"):
+        chunks = split_into_chunks(text)
+    tally = TopicTally()
+    for i, topics in iter_chunk_topics(chunks, model=model):
+        tally.add(topics, chunk=i)
+    ranked = tally.ranked(limit)
+    return {"topics": ranked}, chunks, tally.sources(ranked)
 
 
-nlp = spacy.load("en_core_web_sm")
+def extract_topics_from_pdf_text(text, model=None, output_json="topics.json"):
+    result, _, _ = extract_topics_with_sources(text, model=model)
+    return result
 
 
 def clean_and_extract_keywords(topic_text, max_keywords=10):
+    nlp = loader.get_spacy()
     doc = nlp(topic_text)
     noun_chunks = [
         chunk.text.strip() for chunk in doc.noun_chunks if len(chunk.text.strip()) > 3
@@ -0,0 +1 @@
+# Offline translation of generated questions
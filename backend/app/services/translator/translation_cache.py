@@ -0,0 +1,123 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from app.services.metrics import tracer
+
+
+# Constants
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", os.path.join(_BASE_DIR, "translation_cache.sqlite3"))
+MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "200000"))
+# Eviction runs every EVICT_EVERY writes rather than on each one
+EVICT_EVERY = 100
+BUSY_TIMEOUT = 10.0  # seconds to wait for another worker's write lock
+# SQLite's default limit on host parameters per statement is 999
+LOOKUP_BATCH = 500
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def text_key(text, model):
+    """Cache key: the source string and the model (language pair) that translated it."""
+    digest = hashlib.sha256()
+    for part in (model, text):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class TranslationCache:
+    """
+    Persistent (text hash, language pair) -> translation cache in SQLite, shared by every
+    worker process. Bounded to `max_entries` rows; the least recently used rows are evicted first.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " key TEXT PRIMARY KEY, translation TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, keys):
+        """{key: translation} for the cached keys. Hits refresh their entries' recency."""
+        found = {}
+        try:
+            conn = self._connection()
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                marks = ",".join("?" * len(batch))
+                found.update(conn.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({marks})", batch).fetchall())
+                hits = [key for key in batch if key in found]
+                if hits:
+                    conn.execute(
+                        f"UPDATE translations SET last_used = ? WHERE key IN ({','.join('?' * len(hits))})",
+                        [time.time(), *hits])
+        except sqlite3.Error as e:
+            log(f"Translation cache read failed: {e}")
+        tracer.increment("translation_cache_lookups_total", "result", "hit", len(found))
+        tracer.increment("translation_cache_lookups_total", "result", "miss", len(keys) - len(found))
+        return found
+
+    def put_many(self, items):
+        """Store (key, translation) pairs in one transaction."""
+        if not items:
+            return
+        try:
+            conn = self._connection()
+            now = time.time()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations (key, translation, last_used) VALUES (?, ?, ?)",
+                    [(key, translation, now) for key, translation in items],
+                )
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            with self._lock:
+                before = self._writes
+                self._writes += len(items)
+                evict = before // EVICT_EVERY != self._writes // EVICT_EVERY
+            if evict:
+                self.evict()
+        except sqlite3.Error as e:
+            log(f"Translation cache write failed: {e}")
+
+    def evict(self):
+        conn = self._connection()
+        deleted = conn.execute(
+            "DELETE FROM translations WHERE key IN ("
+            " SELECT key FROM translations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        if deleted:
+            tracer.increment("translation_cache_evictions_total", "cache", "translations", deleted)
+            log(f"Evicted {deleted} least recently used translation cache entries")
+
+
+# Shared by every translation request in this process
+translation_cache = TranslationCache()
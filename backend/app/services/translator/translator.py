@@ -0,0 +1,92 @@
+import os
+import threading
+from app.services.metrics import tracer
+from app.services.models import loader
+from .translation_cache import text_key, translation_cache
+
+
+# Constants
+# Target languages served, each by an English -> <lang> MarianMT model
+SUPPORTED_LANGUAGES = tuple(
+    lang.strip() for lang in os.getenv("TRANSLATION_LANGUAGES", "hi,mr,fr,de,es").split(",") if lang.strip()
+)
+MODEL_TEMPLATE = os.getenv("TRANSLATION_MODEL_TEMPLATE", "Helsinki-NLP/opus-mt-en-{lang}")
+# Strings per forward pass; they are sorted by length first so each batch needs little padding
+BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "32"))
+MAX_TOKENS = 512  # Marian's position limit
+# Greedy decoding; beam search is several times slower on CPU for little gain on short strings
+NUM_BEAMS = int(os.getenv("TRANSLATION_NUM_BEAMS", "1"))
+
+# torch already spreads one pass over every core, so passes run one at a time
+_model_lock = threading.Lock()
+
+
+# Logging
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+def model_name(lang):
+    return MODEL_TEMPLATE.format(lang=lang)
+
+
+def run_model(texts, name):
+    """Translate `texts` with the quantized model, in length-sorted padded batches; returns them in input order."""
+    import torch
+
+    tokenizer, model = loader.get_translator(name)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    results = [None] * len(texts)
+    with _model_lock, torch.inference_mode():
+        for start in range(0, len(order), BATCH_SIZE):
+            batch = order[start:start + BATCH_SIZE]
+            inputs = tokenizer(
+                [texts[i] for i in batch],
+                return_tensors="pt", padding=True, truncation=True, max_length=MAX_TOKENS,
+            )
+            outputs = model.generate(**inputs, num_beams=NUM_BEAMS, max_new_tokens=MAX_TOKENS)
+            for i, translation in zip(batch, tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                results[i] = translation
+    return results
+
+
+def translate_texts(texts, lang):
+    """
+    Translate a list of strings into `lang`. Every distinct string is translated at most
+    once: repeated ones (shared options, repeated stems) are deduplicated, cached ones are
+    read from the translation cache, and the rest go through the model together.
+    """
+    name = model_name(lang)
+    unique = list(dict.fromkeys(text for text in texts if text.strip()))
+    keys = {text: text_key(text, name) for text in unique}
+    cached = translation_cache.get_many(list(keys.values()))
+    translated = {text: cached[key] for text, key in keys.items() if key in cached}
+    missing = [text for text in unique if text not in translated]
+    if missing:
+        with tracer.span("translate"):
+            outputs = run_model(missing, name)
+        translation_cache.put_many([(keys[text], output) for text, output in zip(missing, outputs)])
+        translated.update(zip(missing, outputs))
+    log(f"Translated {len(texts)} strings into '{lang}': {len(unique)} distinct, "
+        f"{len(unique) - len(missing)} cached, {len(missing)} through the model")
+    return [translated.get(text, text) for text in texts]
+
+
+def translate_questions(questions, lang):
+    """
+    Translate the question, option and explanation texts of generated questions (the
+    generator's shape). Option labels, correct_answer and topics stay as they are.
+    """
+    texts = []
+    for question in questions:
+        texts.append(question["question"])
+        texts.extend(question["options"].values())
+        texts.append(question["explanation"])
+    translated = iter(translate_texts(texts, lang))
+
+    result = []
+    for question in questions:
+        text = next(translated)
+        options = {label: next(translated) for label in question["options"]}
+        result.append({**question, "question": text, "options": options, "explanation": next(translated)})
+    return result
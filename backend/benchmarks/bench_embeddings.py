@@ -0,0 +1,85 @@
+"""
+Compare query-embedding throughput in-process and through the shared embedding server.
+
+Each of --concurrency threads embeds single retrieval-style queries, like concurrent
+/generate-questions/ requests do. The server is started in a subprocess for the run;
+RSS is reported for this process (the "worker") and for the server.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embeddings --concurrency 1 8 32 --queries 256
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.run_benchmarks import peak_rss_mb
+
+
+SOCKET_PATH = "/tmp/mcq-bench-embeddings.sock"
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run(encode, concurrency, queries):
+    texts = [f"Topic: Topic {i}. Content in given text related to Topic {i}." for i in range(queries)]
+    per_thread = [texts[i::concurrency] for i in range(concurrency)]
+
+    def worker(batch):
+        for text in batch:
+            encode([text])
+
+    threads = [threading.Thread(target=worker, args=(batch,)) for batch in per_thread]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return queries / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=256)
+    args = parser.parse_args()
+
+    env = dict(os.environ, EMBEDDING_SOCKET=SOCKET_PATH)
+    server = subprocess.Popen([sys.executable, "-m", "app.services.models.embedding_server"], env=env)
+    try:
+        while not os.path.exists(SOCKET_PATH):
+            if server.poll() is not None:
+                raise SystemExit("Embedding server failed to start")
+            time.sleep(0.1)
+
+        from app.services.models import embeddings
+
+        client = embeddings.EmbeddingClient(SOCKET_PATH)
+        client.encode(["warm up"])
+        for concurrency in args.concurrency:
+            rate = run(client.encode, concurrency, args.queries)
+            print(f"server     concurrency {concurrency:>3}: {rate:8.1f} embeddings/s")
+        worker_rss = peak_rss_mb()
+        server_rss = rss_mb(server.pid)
+
+        embeddings.encode_local(["warm up"])
+        for concurrency in args.concurrency:
+            rate = run(embeddings.encode_local, concurrency, args.queries)
+            print(f"in-process concurrency {concurrency:>3}: {rate:8.1f} embeddings/s")
+        print(f"worker peak RSS: {worker_rss:.0f} MB with the server, {peak_rss_mb():.0f} MB with its own model "
+              f"(server RSS {server_rss:.0f} MB, shared by every worker)")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
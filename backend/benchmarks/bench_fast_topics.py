@@ -0,0 +1,59 @@
+"""
+Time the LLM-free ("fast") topic extraction mode on the sample PDFs.
+
+Models are loaded once before timing, as they are in a warmed-up server. With --llm the
+LLM mode runs on the same text for comparison (needs Ollama or the fake server).
+
+Usage (from backend/):
+    python -m benchmarks.bench_fast_topics --pdfs ../testing_data/*.pdf --repeat 3
+"""
+import argparse
+import glob
+import json
+import time
+
+from app.services.models import loader
+from app.services.topic_extracting import topic_extractor
+from app.services.topic_extracting.fast_topics import extract_topics_fast
+
+
+def time_call(fn, text, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result["topics"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob("../testing_data/*.pdf")))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm", action="store_true", help="Also time the LLM mode")
+    parser.add_argument("--output", default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    loader.get_spacy()
+    loader.get_embedder()
+
+    report = []
+    for pdf in args.pdfs:
+        text = topic_extractor.extract_text_from_pdf(pdf)
+        seconds, topics = time_call(extract_topics_fast, text, args.repeat)
+        row = {"pdf": pdf, "words": len(text.split()), "fast_seconds": seconds, "fast_topics": topics}
+        if args.llm:
+            row["llm_seconds"], row["llm_topics"] = time_call(
+                topic_extractor.extract_topics_from_pdf_text, text, 1)
+        report.append(row)
+        print(f"{pdf}: {row['words']} words, fast {seconds * 1000:.0f} ms"
+              + (f", llm {row['llm_seconds']:.1f} s" if args.llm else ""))
+        print(f"    {', '.join(topics)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
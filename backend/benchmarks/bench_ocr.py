@@ -0,0 +1,82 @@
+"""
+Measure PDF text extraction throughput with selective OCR on the sample PDFs.
+
+For each PDF it reports how many pages the classifier sends to OCR, and pages/s for the
+text-layer-only pass, a cold OCR pass (empty page cache) and a warm one (all cached).
+OCR needs Tesseract installed; without it only the classification is reported.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ocr --pdfs ../testing_data/*.pdf --workers 4
+"""
+import argparse
+import glob
+import json
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from app.services.ocr import page_ocr
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def text_layer_only(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return [page.get_text() for page in doc]
+
+
+def scanned_pages(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return [page.number for page in doc if page_ocr.needs_ocr(page, page.get_text())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=sorted(glob.glob("../testing_data/*.pdf")))
+    parser.add_argument("--workers", type=int, default=page_ocr.OCR_WORKERS)
+    parser.add_argument("--output", default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    page_ocr.OCR_WORKERS = args.workers
+    page_ocr.OCR_CACHE_DIR = tempfile.mkdtemp(prefix="ocr_bench_")
+    ocr = page_ocr.ocr_available()
+    if not ocr:
+        print("Tesseract not found: reporting page classification only")
+
+    report = []
+    for pdf in args.pdfs:
+        layer_seconds, pages = timed(text_layer_only, pdf)
+        scanned = scanned_pages(pdf)
+        row = {
+            "pdf": pdf,
+            "pages": len(pages),
+            "scanned_pages": len(scanned),
+            "text_layer_pages_per_s": len(pages) / layer_seconds,
+        }
+        if ocr:
+            cold_seconds, text = timed(page_ocr.extract_text, pdf)
+            warm_seconds, _ = timed(page_ocr.extract_text, pdf)
+            row.update(
+                ocr_cold_pages_per_s=len(pages) / cold_seconds,
+                ocr_warm_pages_per_s=len(pages) / warm_seconds,
+                chars_before=sum(len(page) for page in pages),
+                chars_after=len(text),
+            )
+        report.append(row)
+        print(f"{pdf}: {row['pages']} pages, {row['scanned_pages']} scanned, "
+              f"text layer {row['text_layer_pages_per_s']:.0f} pages/s"
+              + (f", OCR cold {row['ocr_cold_pages_per_s']:.1f} pages/s, warm {row['ocr_warm_pages_per_s']:.0f} pages/s"
+                 if ocr else ""))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
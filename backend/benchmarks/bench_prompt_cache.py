@@ -0,0 +1,92 @@
+"""
+Compare Ollama prompt-eval cost for the old (variable-first) and the new (static-prefix-first)
+MCQ prompt layout, using the prompt_eval_count / prompt_eval_duration fields reported by Ollama.
+
+Usage (from backend/, with Ollama running):
+    python -m benchmarks.bench_prompt_cache --pdf ../testing_data/d-f-block-ncert.pdf --calls 5
+"""
+import argparse
+import json
+import statistics
+
+import fitz  # PyMuPDF
+
+from app.services.mcq_generation import mcq_generator
+from app.services.mcq_generation.prompt import prompt_func
+
+
+def load_extracts(pdf_path, calls, words_per_extract=400):
+    doc = fitz.open(pdf_path)
+    words = " ".join(page.get_text() for page in doc).split()
+    extracts = [
+        " ".join(words[i: i + words_per_extract]) for i in range(0, len(words), words_per_extract)
+    ]
+    if not extracts:
+        raise SystemExit(f"No text found in {pdf_path}")
+    # With one extract every call sends the same prompt, so both layouts reuse the whole
+    # prompt and there is nothing to compare
+    if len(extracts) < 2:
+        raise SystemExit(f"{pdf_path} has a single {words_per_extract}-word extract, use a longer PDF")
+    return [extracts[i % len(extracts)] for i in range(calls)]
+
+
+def variable_first_prompt(text_extract, topic, difficulty, number_of_questions):
+    # Previous layout: the text extract came before the static instructions,
+    # so no two calls shared a token prefix.
+    return f"{text_extract}\n\n{prompt_func('', topic, difficulty, number_of_questions)}"
+
+
+def run_layout(name, build_prompt, extracts, num_predict):
+    samples = []
+    for i, extract in enumerate(extracts):
+        payload = mcq_generator.build_payload(build_prompt(extract, ["Benchmark"], "medium", 1))
+        payload["options"]["num_predict"] = num_predict
+        result = mcq_generator.ollama_generate(payload)
+        if result is None:
+            raise SystemExit("Ollama call failed, is the server running?")
+        samples.append({
+            "call": i,
+            "prompt_eval_count": result.get("prompt_eval_count", 0),
+            "prompt_eval_ms": result.get("prompt_eval_duration", 0) / 1e6,
+        })
+    # The first call of each layout warms the cache, only the following ones are compared
+    warm = samples[1:] or samples
+    return {
+        "layout": name,
+        "samples": samples,
+        "mean_prompt_eval_count": statistics.mean(s["prompt_eval_count"] for s in warm),
+        "mean_prompt_eval_ms": statistics.mean(s["prompt_eval_ms"] for s in warm),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="../testing_data/d-f-block-ncert.pdf")
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--num-predict", type=int, default=1,
+                        help="Tokens to decode per call; 1 isolates prompt evaluation")
+    parser.add_argument("--output", default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    extracts = load_extracts(args.pdf, args.calls)
+    report = {
+        "model": mcq_generator.MODEL_NAME,
+        "before": run_layout("variable_first", variable_first_prompt, extracts, args.num_predict),
+        "after": run_layout("static_prefix_first", prompt_func, extracts, args.num_predict),
+    }
+    before = report["before"]["mean_prompt_eval_ms"]
+    after = report["after"]["mean_prompt_eval_ms"]
+    report["speedup"] = before / after if after else None
+
+    print(f"Before: {report['before']['mean_prompt_eval_count']:.0f} tokens evaluated, {before:.1f} ms")
+    print(f"After:  {report['after']['mean_prompt_eval_count']:.0f} tokens evaluated, {after:.1f} ms")
+    if report["speedup"]:
+        print(f"Prompt-eval speedup: {report['speedup']:.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Time the question hot path: decoding an LLM structured-output response, validating it and
+serializing the questions into a response body. The previous path (pydantic models dumped
+to dicts, a per-item dict validation loop, jsonable_encoder + json.dumps) is compared with
+the current one (msgspec decoding into slotted dataclasses, orjson serialization).
+
+Usage (from backend/):
+    python -m benchmarks.bench_questions --questions 10 --iterations 2000
+"""
+import argparse
+import json
+import time
+from typing import List, Literal
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+import orjson
+
+from app.schemas import question as schema
+
+
+class LegacyOptions(BaseModel):
+    A: str
+    B: str
+    C: str
+    D: str
+
+
+class LegacyQuestion(BaseModel):
+    question: str
+    options: LegacyOptions
+    correct_answer: Literal["A", "B", "C", "D"]
+    topics: List[str]
+    explanation: str
+
+
+class LegacyQuestionList(BaseModel):
+    questions: List[LegacyQuestion]
+
+
+def legacy_validate(items):
+    # The dict checks mcq_generator ran on every parsed question
+    for item in items:
+        if not all(field in item for field in ("question", "options", "correct_answer", "topics", "explanation")):
+            return False
+        if not isinstance(item["options"], dict) or item["correct_answer"] not in item["options"]:
+            return False
+    return True
+
+
+def sample_response(num_questions):
+    questions = [
+        {
+            "question": f"Which of the following best explains trend {i} in the atomic radii of the d-block elements?",
+            "options": {
+                "A": "Poor shielding by the inner d electrons increases the effective nuclear charge",
+                "B": "The lanthanoid contraction cancels the expected increase in size",
+                "C": "Added electrons enter the outermost s orbital of every element",
+                "D": "Metallic bonding becomes weaker across the series",
+            },
+            "correct_answer": "ABCD"[i % 4],
+            "topics": ["Atomic Size", "d-block elements"],
+            "explanation": "Electrons added to the inner (n-1)d orbitals shield the outer electrons poorly, "
+                           "so the effective nuclear charge rises and the radius shrinks slightly. " * 2,
+        }
+        for i in range(num_questions)
+    ]
+    return json.dumps({"questions": questions})
+
+
+def legacy(response):
+    items = [question.model_dump() for question in LegacyQuestionList.model_validate_json(response).questions]
+    assert legacy_validate(items)
+    return json.dumps(jsonable_encoder(items), ensure_ascii=False).encode("utf-8")
+
+
+def current(response):
+    questions = schema.decode_question_list(response)
+    return orjson.dumps(questions)
+
+
+def measure(fn, response, iterations):
+    fn(response)  # warm up
+    start = time.perf_counter()
+    for _ in range(iterations):
+        body = fn(response)
+    return {"us_per_call": (time.perf_counter() - start) / iterations * 1e6, "body_bytes": len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, nargs="+", default=[1, 10, 50], help="Questions per response")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--output", default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    report = []
+    for num_questions in args.questions:
+        response = sample_response(num_questions)
+        assert json.loads(legacy(response)) == json.loads(current(response))
+        before = measure(legacy, response, args.iterations)
+        after = measure(current, response, args.iterations)
+        report.append({"questions": num_questions, "before": before, "after": after})
+        print(f"{num_questions:>3} questions: {before['us_per_call']:.1f} us -> {after['us_per_call']:.1f} us "
+              f"({before['us_per_call'] / after['us_per_call']:.1f}x)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Count parse failures and retries with and without Ollama structured outputs (`format`).
+
+For each mode, the MCQ call site runs the same prompts through the generator's parse and
+validation path, and the topic call site runs chunks through parse_topics. Run it against a
+real Ollama server; the fake server always answers with valid JSON.
+
+Usage (from backend/, with Ollama running):
+    python -m benchmarks.bench_structured_output --pdf ../testing_data/d-f-block-ncert.pdf --calls 20
+"""
+import argparse
+import json
+
+import fitz  # PyMuPDF
+
+from app.services.mcq_generation import mcq_generator
+from app.services.mcq_generation.prompt import prompt_func
+from app.services.topic_extracting import topic_extractor
+
+
+def load_extracts(pdf_path, calls, words_per_extract=400):
+    doc = fitz.open(pdf_path)
+    words = " ".join(page.get_text() for page in doc).split()
+    extracts = [
+        " ".join(words[i: i + words_per_extract]) for i in range(0, len(words), words_per_extract)
+    ]
+    if not extracts:
+        raise SystemExit(f"No text found in {pdf_path}")
+    if len(extracts) < min(2, calls):
+        print(f"Warning: {pdf_path} has a single {words_per_extract}-word extract, every call sends the same prompt")
+    return [extracts[i % len(extracts)] for i in range(calls)]
+
+
+def run_mcq(extracts, num_questions):
+    parse_failures = retries = calls = 0
+    for extract in extracts:
+        payload = mcq_generator.build_payload(
+            prompt_func(extract, ["Benchmark"], "medium", num_questions), num_questions
+        )
+        for attempt in range(mcq_generator.MAX_TRIES):
+            calls += 1
+            retries += 1 if attempt else 0
+            output = mcq_generator.ollama_prompt(payload)
+            parsed = mcq_generator.parse_questions(output) if output else None
+            if parsed and mcq_generator.validate_questions(parsed):
+                break
+            parse_failures += 1
+    return {"prompts": len(extracts), "calls": calls, "parse_failures": parse_failures, "retries": retries}
+
+
+def run_topics(extracts):
+    regex_fallbacks = 0
+    for extract in extracts:
+        response = topic_extractor.query_ollama_chunk(extract)
+        try:
+            topic_extractor.TopicList.model_validate_json(response)
+            continue
+        except Exception:
+            pass
+        try:
+            if isinstance(json.loads(response), list):
+                continue
+        except Exception:
+            pass
+        regex_fallbacks += 1
+    return {"calls": len(extracts), "regex_fallbacks": regex_fallbacks}
+
+
+def run_mode(structured, extracts, num_questions):
+    mcq_generator.STRUCTURED_OUTPUT = structured
+    topic_extractor.STRUCTURED_OUTPUT = structured
+    return {"mcq": run_mcq(extracts, num_questions), "topics": run_topics(extracts)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="../testing_data/d-f-block-ncert.pdf")
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--num-questions", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    extracts = load_extracts(args.pdf, args.calls)
+    report = {
+        "model": mcq_generator.MODEL_NAME,
+        "before": run_mode(False, extracts, args.num_questions),
+        "after": run_mode(True, extracts, args.num_questions),
+    }
+    for label in ("before", "after"):
+        mcq, topics = report[label]["mcq"], report[label]["topics"]
+        print(f"{label:>6}: MCQ parse failures {mcq['parse_failures']}/{mcq['calls']} calls, "
+              f"{mcq['retries']} retries; topic regex fallbacks {topics['regex_fallbacks']}/{topics['calls']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
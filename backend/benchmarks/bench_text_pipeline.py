@@ -0,0 +1,87 @@
+"""
+Peak memory of OCR text cleanup + sentence splitting: whole-string passes vs. the streaming
+generator pipeline used by generate_faiss_db.
+
+The text of each of the largest sample PDFs is repeated --scale times to stand in for a
+long book, written to a temporary file and processed from there, the way the index build
+reads OCR_text.txt. Peak Python heap allocation is measured with tracemalloc.
+
+Usage (from backend/):
+    python -m benchmarks.bench_text_pipeline --top 3 --scale 35
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import tempfile
+import time
+import tracemalloc
+
+from app.services.ocr import page_ocr
+from app.services.rag import generate_faiss_db
+
+
+def whole_string(path):
+    # The previous implementation: every pass copies the whole document
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    text = re.sub(r"[^\x00-\x7F]+", " ", text)
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"\n", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = text.replace("\r", " ").replace("\n", " ")
+    sentences = [s.strip() for s in re.split(generate_faiss_db.SENTENCE_SPLIT_REGEX, text) if s and s.strip()]
+    return sum(1 for _ in sentences)
+
+
+def streaming(path):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line.rstrip("\n") for line in f)
+        return sum(1 for _ in generate_faiss_db.iter_sentences(generate_faiss_db.normalize_lines(lines)))
+
+
+def measure(fn, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    sentences = fn(path)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"sentences": sentences, "seconds": seconds, "peak_mb": peak / 2**20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="+", default=glob.glob("../testing_data/*.pdf"))
+    parser.add_argument("--top", type=int, default=3, help="Use the N largest PDFs")
+    parser.add_argument("--scale", type=int, default=35, help="Repeat each text N times (~1,000 pages)")
+    parser.add_argument("--output", default=None, help="Optional path to write the JSON report")
+    args = parser.parse_args()
+
+    pdfs = sorted(args.pdfs, key=os.path.getsize, reverse=True)[:args.top]
+    report = []
+    for pdf in pdfs:
+        text = page_ocr.extract_text(pdf) * args.scale
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+            f.write(text)
+            path = f.name
+        size_mb = len(text) / 2**20
+        del text
+        try:
+            before = measure(whole_string, path)
+            after = measure(streaming, path)
+        finally:
+            os.remove(path)
+        report.append({"pdf": pdf, "scale": args.scale, "text_mb": size_mb, "before": before, "after": after})
+        print(f"{pdf} x{args.scale} ({size_mb:.1f} MB of text): peak {before['peak_mb']:.1f} MB -> "
+              f"{after['peak_mb']:.2f} MB, {before['seconds']:.2f}s -> {after['seconds']:.2f}s, "
+              f"{after['sentences']} sentences")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Minimal stand-in for the Ollama HTTP API used by the benchmarks.
+
+Serves /api/generate (MCQ generation) and /api/chat (topic extraction) with canned,
+schema-valid JSON after a configurable delay, and reports Ollama-style duration fields.
+Requests that pass a `format` schema get the structured-output object shape, others the
+bare arrays older prompts asked for. /api/generate streams NDJSON unless "stream": false,
+and stops decoding when the client closes the connection.
+
+Usage (from backend/):
+    python -m benchmarks.fake_ollama --port 11435 --latency 0.5
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Constants
+DEFAULT_LATENCY = 0.2  # seconds of simulated decoding per call
+DEFAULT_PROMPT_EVAL_MS = 20.0  # simulated prompt evaluation per call
+# Reported by /api/tags so the routing policy sees its default candidates as installed
+INSTALLED_MODELS = ["llama3.1:latest", "llama3.2:3b"]
+TOPIC_RE = re.compile(r"### Topic : (.+)")
+COUNT_RE = re.compile(r"GIVE EXACTLY (\d+) QUESTIONS")
+WORD_RE = re.compile(r"[A-Za-z][A-Za-z-]{5,}")
+
+
+def canned_questions(prompt):
+    topic_match = TOPIC_RE.search(prompt)
+    count_match = COUNT_RE.search(prompt)
+    topic = topic_match.group(1).strip() if topic_match else "General"
+    count = int(count_match.group(1)) if count_match else 1
+    return [
+        {
+            "question": f"Benchmark question {i + 1} about {topic}?",
+            "options": {
+                "A": f"First statement about {topic}",
+                "B": f"Second statement about {topic}",
+                "C": f"Third statement about {topic}",
+                "D": f"Fourth statement about {topic}",
+            },
+            "correct_answer": "ABCD"[i % 4],
+            "topics": [topic],
+            "explanation": f"Option {'ABCD'[i % 4]} is correct for this canned {topic} question.",
+        }
+        for i in range(count)
+    ]
+
+
+def canned_topics(prompt, limit=5):
+    # Most frequent long words of the chunk, so topics differ between documents
+    text = prompt.rsplit('"""', 2)[-2] if prompt.count('"""') >= 2 else prompt
+    counts = Counter(word.lower() for word in WORD_RE.findall(text))
+    return [word.title() for word, _ in counts.most_common(limit)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    latency = DEFAULT_LATENCY
+    prompt_eval_ms = DEFAULT_PROMPT_EVAL_MS
+    requests_served = 0
+    streams_aborted = 0
+    stream_chunks = 8
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body, status=200):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream_json(self, body):
+        # Split the response text over several NDJSON lines, like Ollama's token stream
+        text = body.pop("response")
+        step = max(1, -(-len(text) // self.stream_chunks))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for start in range(0, len(text), step):
+                line = {"model": body["model"], "response": text[start:start + step], "done": False}
+                self.wfile.write(json.dumps(line).encode("utf-8") + b"\n")
+                self.wfile.flush()
+                time.sleep(self.latency / self.stream_chunks)
+            self.wfile.write(json.dumps({**body, "response": ""}).encode("utf-8") + b"\n")
+        except (BrokenPipeError, ConnectionResetError):
+            with self._lock:
+                FakeOllamaHandler.streams_aborted += 1
+        self.close_connection = True
+
+    def _timings(self, prompt):
+        return {
+            "total_duration": int((self.latency + self.prompt_eval_ms / 1000) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": len(prompt) // 4,
+            "prompt_eval_duration": int(self.prompt_eval_ms * 1e6),
+            "eval_count": 64,
+            "eval_duration": int(self.latency * 1e9),
+        }
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": name, "model": name} for name in INSTALLED_MODELS]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        with self._lock:
+            FakeOllamaHandler.requests_served += 1
+        stream = self.path == "/api/generate" and payload.get("stream", True)
+        # Streamed responses spread the decoding latency over the chunks
+        time.sleep(self.prompt_eval_ms / 1000 + (0 if stream else self.latency))
+
+        if self.path == "/api/generate":
+            prompt = payload.get("prompt", "")
+            questions = canned_questions(prompt)
+            body = {
+                "model": payload.get("model"),
+                "response": json.dumps({"questions": questions} if payload.get("format") else questions),
+                "done": True,
+                **self._timings(prompt),
+            }
+            if stream:
+                self._stream_json(body)
+            else:
+                self._send_json(body)
+        elif self.path == "/api/chat":
+            prompt = payload.get("messages", [{}])[-1].get("content", "")
+            topics = canned_topics(prompt)
+            self._send_json({
+                "model": payload.get("model"),
+                "created_at": "1970-01-01T00:00:00Z",
+                "message": {
+                    "role": "assistant",
+                    "content": json.dumps({"topics": topics} if payload.get("format") else topics),
+                },
+                "done": True,
+                **self._timings(prompt),
+            })
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+def start_server(port=0, latency=DEFAULT_LATENCY, prompt_eval_ms=DEFAULT_PROMPT_EVAL_MS):
+    """Start the fake server on a background thread. Returns (server, base_url)."""
+    handler = type("ConfiguredFakeOllamaHandler", (FakeOllamaHandler,), {
+        "latency": latency,
+        "prompt_eval_ms": prompt_eval_ms,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY)
+    parser.add_argument("--prompt-eval-ms", type=float, default=DEFAULT_PROMPT_EVAL_MS)
+    args = parser.parse_args()
+
+    server, url = start_server(args.port, args.latency, args.prompt_eval_ms)
+    print(f"Fake Ollama listening on {url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
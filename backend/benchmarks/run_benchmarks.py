@@ -0,0 +1,303 @@
+"""
+End-to-end benchmark of /extract-topics/ and /generate-questions/ over the testing_data PDFs.
+
+The FastAPI app runs in-process and talks to a local fake Ollama server (see fake_ollama.py),
+so the numbers measure our own pipeline plus a fixed, configurable LLM latency. For every PDF
+and concurrency level the report contains throughput, p50/p95/p99 latency, the peak RSS sampled
+while that case ran (Linux only) and the mean per-stage cost taken from the Server-Timing header.
+The process-wide maximum RSS (ru_maxrss) is reported once, for startup and for the whole run.
+
+Usage (from backend/):
+    python -m benchmarks.run_benchmarks --concurrency 1 4 8 --requests 16
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_ollama import DEFAULT_LATENCY, DEFAULT_PROMPT_EVAL_MS, start_server
+
+
+# Constants
+_BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_PDF_GLOB = os.path.join(_BACKEND_DIR, "..", "testing_data", "*.pdf")
+RESULTS_DIR = os.path.join(_BACKEND_DIR, "benchmarks", "results")
+DEFAULT_TOPICS_PER_REQUEST = 3
+DEFAULT_NUM_QUESTIONS = 6
+
+
+def log(text):
+    print(f"{__name__} - {text}")
+
+
+# ----------------------------
+# Measurement helpers
+# ----------------------------
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb():
+    """Highest RSS of the process so far (it never goes down, so it is not per case)."""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    """RSS of the process right now, from /proc (None where it is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return None
+
+
+class RssSampler:
+    """Highest current RSS seen while the block runs, sampled every `interval` seconds."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is not None:
+            self.peak_mb = rss if self.peak_mb is None else max(self.peak_mb, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def parse_server_timing(header):
+    """Parse 'stage;dur=12.3;desc="2x", ...' into {stage: milliseconds}."""
+    stages = {}
+    for part in filter(None, (p.strip() for p in (header or "").split(","))):
+        fields = part.split(";")
+        for field in fields[1:]:
+            if field.startswith("dur="):
+                stages[fields[0]] = stages.get(fields[0], 0.0) + float(field[4:])
+    return stages
+
+
+def summarize(latencies, wall_seconds, stage_samples, errors, peak_rss=None):
+    stage_means = {
+        stage: sum(values) / len(values) for stage, values in sorted(stage_samples.items())
+    }
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": len(latencies) / wall_seconds if wall_seconds else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+        },
+        "stage_ms": stage_means,
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def timed_call(send):
+    start = time.perf_counter()
+    response = send()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return response, elapsed_ms
+
+
+def run_level(send, concurrency, num_requests):
+    """Fire num_requests calls with at most `concurrency` in flight."""
+    latencies, stage_samples, errors = [], defaultdict(list), 0
+    start = time.perf_counter()
+    with RssSampler() as rss, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for response, elapsed_ms in executor.map(lambda _: timed_call(send), range(num_requests)):
+            if response.status_code != 200:
+                errors += 1
+                continue
+            latencies.append(elapsed_ms)
+            for stage, ms in parse_server_timing(response.headers.get("server-timing")).items():
+                stage_samples[stage].append(ms)
+    return summarize(latencies, time.perf_counter() - start, stage_samples, errors, rss.peak_mb)
+
+
+# ----------------------------
+# Benchmark driver
+# ----------------------------
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_BACKEND_DIR, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def benchmark_pdf(client, pdf_path, concurrency_levels, num_requests, num_questions):
+    name = os.path.basename(pdf_path)
+    log(f"Benchmarking {name}")
+
+    # Topic extraction rebuilds the shared vector store, so it is measured serially
+    def send_extract():
+        with open(pdf_path, "rb") as f:
+            return client.post("/extract-topics/", files={"file": (name, f, "application/pdf")})
+
+    with RssSampler() as rss:
+        response, elapsed_ms = timed_call(send_extract)
+    ok = response.status_code == 200
+    stages = parse_server_timing(response.headers.get("server-timing"))
+    extract = summarize(
+        [elapsed_ms] if ok else [], elapsed_ms / 1000,
+        {stage: [ms] for stage, ms in stages.items()}, 0 if ok else 1, rss.peak_mb,
+    )
+    topics = response.json().get("topics", []) if ok else []
+    if not topics:
+        log(f"No topics extracted from {name}, skipping question generation")
+        return {"pdf": name, "extract_topics": extract, "generate_questions": {}}
+
+    form = {
+        "topics": json.dumps(topics[:DEFAULT_TOPICS_PER_REQUEST]),
+        "difficulty": "medium",
+        "num_questions": str(num_questions),
+    }
+
+    def send_generate():
+        return client.post("/generate-questions/", data=form)
+
+    generate = {}
+    for concurrency in concurrency_levels:
+        log(f"  /generate-questions/ at concurrency {concurrency}")
+        generate[str(concurrency)] = run_level(send_generate, concurrency, num_requests)
+    return {"pdf": name, "topics": topics, "extract_topics": extract, "generate_questions": generate}
+
+
+def run(args):
+    server, url = start_server(latency=args.latency, prompt_eval_ms=args.prompt_eval_ms)
+    # Both the requests-based and the ollama-client call sites read OLLAMA_HOST at import time
+    os.environ["OLLAMA_HOST"] = url
+    os.chdir(_BACKEND_DIR)
+    sys.path.insert(0, _BACKEND_DIR)
+
+    from fastapi.testclient import TestClient
+    import_start = time.perf_counter()
+    from app.main import app
+    import_seconds = time.perf_counter() - import_start
+
+    pdfs = sorted(args.pdfs or glob.glob(DEFAULT_PDF_GLOB))
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests_per_level": args.requests,
+            "num_questions": args.num_questions,
+            "llm_latency_s": args.latency,
+            "llm_prompt_eval_ms": args.prompt_eval_ms,
+        },
+        "results": [],
+    }
+    warm_up_start = time.perf_counter()
+    with TestClient(app) as client:
+        # Entering the client runs the lifespan warm-up
+        report["startup"] = {
+            "import_s": import_seconds,
+            "warm_up_s": time.perf_counter() - warm_up_start,
+            "process_peak_rss_mb": peak_rss_mb(),
+        }
+        log(f"Startup: import {import_seconds:.2f}s, warm-up {report['startup']['warm_up_s']:.2f}s")
+        for pdf_path in pdfs:
+            report["results"].append(
+                benchmark_pdf(client, pdf_path, args.concurrency, args.requests, args.num_questions)
+            )
+    report["process_peak_rss_mb"] = peak_rss_mb()
+    server.shutdown()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log(f"Results written to {output}")
+
+
+# ----------------------------
+# Regression comparison
+# ----------------------------
+def flatten(report):
+    """Map 'pdf/endpoint/concurrency/metric' -> value for the headline metrics."""
+    flat = {}
+    for result in report["results"]:
+        levels = {"extract_topics/1": result["extract_topics"]}
+        for concurrency, summary in result.get("generate_questions", {}).items():
+            levels[f"generate_questions/{concurrency}"] = summary
+        for key, summary in levels.items():
+            prefix = f"{result['pdf']}/{key}"
+            flat[f"{prefix}/throughput_rps"] = summary["throughput_rps"]
+            for pct in ("p50", "p95", "p99"):
+                flat[f"{prefix}/{pct}_ms"] = summary["latency_ms"][pct]
+    return flat
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = flatten(json.load(f))
+    with open(new_path, encoding="utf-8") as f:
+        new = flatten(json.load(f))
+    print(f"{'metric':<70} {'old':>10} {'new':>10} {'change':>8}")
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        if not before or after is None:
+            continue
+        print(f"{key:<70} {before:>10.1f} {after:>10.1f} {(after - before) / before:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", nargs="*", help="PDFs to benchmark (default: testing_data/*.pdf)")
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level")
+    parser.add_argument("--num-questions", type=int, default=DEFAULT_NUM_QUESTIONS)
+    parser.add_argument("--latency", type=float, default=DEFAULT_LATENCY,
+                        help="Simulated LLM decode time per call in seconds")
+    parser.add_argument("--prompt-eval-ms", type=float, default=DEFAULT_PROMPT_EVAL_MS)
+    parser.add_argument("--output", help="Where to write the JSON report "
+                                         "(default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# Gunicorn settings for serving the app with several uvicorn workers.
+#   gunicorn app.main:app -c gunicorn.conf.py
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# Read by the app to size per-worker resources (OCR pools, LLM slots: each worker's scheduler
+# gets OLLAMA_NUM_PARALLEL // workers); preload imports it after this file
+os.environ["WEB_CONCURRENCY"] = str(workers)
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = 300
+graceful_timeout = 300
+keepalive = 300
+
+# Import the app (and load the models) once in the master, then fork the workers:
+# the model weights are shared copy-on-write instead of being loaded per worker.
+preload_app = True
+
+
+def on_starting(server):
+    from app.services.models import loader
+    loader.warm_up()
@@ -27,8 +27,53 @@ ollama run llama3.1 &
 OLLAMA_LLAMA_PID=$!
 echo "🤖 Started Ollama model: llama3.1 (PID $OLLAMA_LLAMA_PID)"
 
-# Trap to kill ollama models on exit
-trap 'echo "🛑 Stopping Ollama models..."; kill $OLLAMA_LLAMA_PID; if type deactivate; then echo "🧹 Deactivating virtual environment..."; deactivate; fi' EXIT
+EMBEDDING_SERVER_PID=""
+
+# Trap to kill ollama models (and the embedding server, if started) on exit
+cleanup() {
+  echo "🛑 Stopping Ollama models..."
+  kill $OLLAMA_LLAMA_PID 2>/dev/null || true
+  if [ -n "$EMBEDDING_SERVER_PID" ]; then
+    echo "🛑 Stopping embedding server..."
+    kill $EMBEDDING_SERVER_PID 2>/dev/null || true
+    rm -f "$EMBEDDING_SOCKET"
+  fi
+  if type deactivate >/dev/null 2>&1; then echo "🧹 Deactivating virtual environment..."; deactivate; fi
+}
+trap cleanup EXIT
+trap 'exit 130' INT TERM
+
+# Production mode: several workers sharing the on-disk index and OCR text
+#   SERVE_MODE=production WEB_CONCURRENCY=4 ./start.sh
+if [ "${SERVE_MODE:-dev}" = "production" ]; then
+  # Optional shared embedding server: one model for all workers, batched across requests
+  #   EMBEDDING_SOCKET=/tmp/mcq-embeddings.sock SERVE_MODE=production ./start.sh
+  if [ -n "${EMBEDDING_SOCKET:-}" ]; then
+    rm -f "$EMBEDDING_SOCKET"
+    python -m app.services.models.embedding_server &
+    EMBEDDING_SERVER_PID=$!
+    echo "🧮 Starting embedding server on $EMBEDDING_SOCKET (PID $EMBEDDING_SERVER_PID)..."
+    # The socket appears once the model is loaded. Workers that start before it would
+    # fall back to (and keep) a model of their own.
+    for _ in $(seq "${EMBEDDING_SERVER_WAIT_SECONDS:-120}"); do
+      [ -S "$EMBEDDING_SOCKET" ] && break
+      if ! kill -0 $EMBEDDING_SERVER_PID 2>/dev/null; then
+        echo "❌ Embedding server exited during startup"
+        exit 1
+      fi
+      sleep 1
+    done
+    if [ ! -S "$EMBEDDING_SOCKET" ]; then
+      echo "❌ Embedding server did not create $EMBEDDING_SOCKET in time"
+      exit 1
+    fi
+    echo "🧮 Embedding server ready"
+  fi
+  echo "🚀 Starting FastAPI backend with ${WEB_CONCURRENCY:-2} workers..."
+  # Not exec'd, so that the exit trap stops the embedding server and Ollama afterwards
+  gunicorn app.main:app -c gunicorn.conf.py
+  exit $?
+fi
 
 # Start FastAPI backend (with auto-reload)
 echo "🚀 Starting FastAPI backend (reload enabled)..."